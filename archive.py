@@ -0,0 +1,381 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# ==========================================
+# CMX A 表歷史資料庫 (本機 SQLite 檔)：每份洗車 / 三合一 A 表匯出只解析、正規化一次 (規則與洗車對帳相同，見 normalizers.normalize_cmx_a)，
+# 依 訂單編號 與 (類別, 訂單日期) 建立索引；對帳時直接選取日期區間，不必重新上傳、解析 xlsx
+# - 同一份檔案 (內容相同) 重複匯入會略過
+# - 退款列同樣保存 (退款時間有值)，比對時排除；另保存退款列在匯出檔中的完整原始內容 (含 金額、原始車牌等所有欄位)，
+#   「A表退款排除名單」與上傳 A 表時相同
+# - 本模組載入時不載入 pandas / openpyxl (介面只需查詢概況)，匯入與選取時才載入
+#
+#   python archive.py ingest --stream 洗車 A1.xlsx A2.xlsx [--db 路徑]
+#   python archive.py list                       # 已匯入的檔案與日期範圍
+#   python archive.py lookup 202609000459        # 查詢單一訂單
+#
+#   CMX_ARCHIVE_DB：資料庫路徑 (命令列未指定 --db 時使用；介面有設定時才提供「歷史資料庫」選項)
+# ==========================================
+
+ARCHIVE_DB = os.environ.get("CMX_ARCHIVE_DB") or None
+STREAMS = ("洗車", "三合一")
+
+COL_ID, COL_CREATED, COL_PLATE, COL_PHONE, COL_REFUND = '訂單編號', '訂單建立時間', '車牌', '手機號碼', '退款時間'
+# 選取結果的欄位 (與上傳 A 表正規化後的欄位相同，另加 訂單建立時間)
+ROW_COLUMNS = [COL_ID, COL_CREATED, COL_PLATE, COL_PHONE, COL_REFUND]
+CHUNK_ROWS = 50000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cmx_files (
+    file_id INTEGER PRIMARY KEY,
+    stream TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    refunds INTEGER NOT NULL,
+    first_date TEXT,
+    last_date TEXT,
+    ingested_at TEXT NOT NULL,
+    UNIQUE (stream, digest)
+);
+CREATE TABLE IF NOT EXISTS cmx_rows (
+    file_id INTEGER NOT NULL,
+    row_no INTEGER NOT NULL,
+    stream TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    order_date TEXT,
+    created_at TEXT,
+    plate TEXT,
+    phone TEXT,
+    refund_time TEXT,
+    PRIMARY KEY (file_id, row_no)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cmx_rows_date ON cmx_rows (stream, order_date);
+CREATE INDEX IF NOT EXISTS cmx_rows_order ON cmx_rows (order_id);
+-- 每份檔案的退款列完整原始內容：欄位順序與型別標記 (cmx_refund_columns) + 逐列 JSON 儲存格 (cmx_refund_rows)，
+-- 選取時還原成與上傳時讀到的相同 DataFrame
+CREATE TABLE IF NOT EXISTS cmx_refund_columns (
+    file_id INTEGER NOT NULL,
+    col_no INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    PRIMARY KEY (file_id, col_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cmx_refund_rows (
+    file_id INTEGER NOT NULL,
+    row_no INTEGER NOT NULL,
+    order_date TEXT,
+    cells TEXT NOT NULL,
+    PRIMARY KEY (file_id, row_no)
+) WITHOUT ROWID;
+-- 舊版以 pickle 儲存的退款列不再讀取 (對應的檔案會在下次匯入時補上退款列)
+DROP TABLE IF EXISTS cmx_refunds;
+"""
+
+
+def connect(path=None):
+    path = path or ARCHIVE_DB
+    if not path:
+        raise ValueError("未指定 A 表歷史資料庫 (--db 或環境變數 CMX_ARCHIVE_DB)")
+    conn = sqlite3.connect(path, timeout=60)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def check_date(value):
+    """
+    日期正規化為 YYYY-MM-DD (也接受 YYYY/MM/DD 與 date 物件)
+    """
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(str(value).strip().replace("/", "-"), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"日期格式錯誤：{value} (應為 YYYY-MM-DD)")
+
+
+def check_stream(stream):
+    if stream not in STREAMS:
+        raise ValueError(f"未知的 A 表類別：{stream} (可用：{', '.join(STREAMS)})")
+    return stream
+
+
+def _text(series):
+    # 寫入 SQLite 的字串欄：空值為 NULL
+    return series.astype(object).where(series.notna(), None)
+
+
+def _stamp(series, fmt="%Y-%m-%d %H:%M:%S"):
+    # 日期欄 ➔ 字串 (無法解析成日期的非空值保留原始文字)，空值為 NULL
+    import pandas as pd
+
+    parsed = pd.to_datetime(series, errors='coerce', format='mixed')
+    return _text(parsed.dt.strftime(fmt).where(parsed.notna(), series.astype(str)).where(series.notna()))
+
+
+def _parse_stamp(series):
+    # _stamp 的反向：整欄都能解析時轉回日期，否則維持原始文字 (與 readers.typed_column 的 DATETIME 規則相同，有值不會變成空值)
+    import pandas as pd
+
+    parsed = pd.to_datetime(series, errors='coerce', format='mixed')
+    return parsed if parsed.notna().sum() == series.notna().sum() else series
+
+
+def _cell(value):
+    # 退款原始列的儲存格 ➔ JSON 值：空值為 null，日期 / 時間以 {"datetime" | "date" | "time": ISO 字串} 標記
+    if value is None or value != value:
+        return None
+    if hasattr(value, "isoformat"):
+        kind = "datetime" if hasattr(value, "hour") and hasattr(value, "year") else "time" if hasattr(value, "hour") else "date"
+        return {kind: value.isoformat()}
+    if hasattr(value, "item"):
+        value = value.item()
+    return value if isinstance(value, (bool, int, float, str)) else str(value)
+
+
+def _uncell(value):
+    # _cell 的反向
+    from datetime import date, time
+
+    if isinstance(value, dict):
+        (kind, text), = value.items()
+        return {"datetime": datetime, "date": date, "time": time}[kind].fromisoformat(text)
+    return value
+
+
+def _refund_frame(spec, rows):
+    # 依欄位順序與型別標記還原退款列 (object 欄的空值與讀取時相同為 NaN；無法套用的型別標記維持 object)
+    import numpy as np
+    import pandas as pd
+
+    columns = []
+    for j, (_, dtype) in enumerate(spec):
+        values = pd.Series([_uncell(row[j]) for row in rows], dtype=object)
+        if dtype == "object":
+            values = values.fillna(np.nan)
+        else:
+            try:
+                values = values.astype(dtype)
+            except (TypeError, ValueError):
+                pass
+        columns.append(values)
+    df = pd.concat(columns, axis=1) if columns else pd.DataFrame(index=range(len(rows)))
+    df.columns = [name for name, _ in spec]
+    return df
+
+
+def _created_column(columns):
+    # 退款原始列的訂單建立時間欄：欄名比對與讀取時一致 (忽略空白)
+    return next((c for c in columns if COL_CREATED in "".join(str(c).split())), None)
+
+
+def ingest(files, stream, path=None):
+    """
+    匯入 A 表匯出檔 (上傳檔或本機路徑)，回傳每份檔案的結果 dict (name / rows / refunds / skipped)
+    """
+    import pandas as pd
+    from readers import DATETIME, ID, content_digest, file_bytes, is_large_file, read_excel_files
+    from normalizers import normalize_cmx_a
+
+    check_stream(stream)
+    schema = {COL_ID: ID, COL_PLATE: ID, COL_PHONE: ID, COL_REFUND: DATETIME, COL_CREATED: DATETIME}
+    conn = connect(path)
+    summaries = []
+    try:
+        for f in files:
+            name = os.path.basename(f) if isinstance(f, (str, os.PathLike)) else f.name
+            digest = content_digest(file_bytes(f))
+            existing = conn.execute(
+                "SELECT f.file_id, f.refunds = 0 OR EXISTS (SELECT 1 FROM cmx_refund_columns r WHERE r.file_id = f.file_id)"
+                " FROM cmx_files f WHERE f.stream = ? AND f.digest = ?", (stream, digest),
+            ).fetchone()
+            # 已匯入過就略過；較早匯入、有退款卻沒有退款原始列的檔案重新匯入 (沿用原本的匯入順序)
+            if existing and existing[1]:
+                summaries.append({"name": name, "rows": 0, "refunds": 0, "skipped": True})
+                continue
+
+            # 讀取方式與洗車對帳相同 (大檔改走串流)，但保留退款列與訂單建立時間；
+            # 退款列另以完整原始列取得 (與洗車對帳讀取上傳 A 表時的退款排除名單相同)
+            engine = {"engine": "stream"} if is_large_file(f) else {}
+            (df_raw, df_ref), = read_excel_files([f], sheet_name=0, header=2, columns=ROW_COLUMNS, schema=schema, full_rows_when=COL_REFUND, **engine)
+            df_raw = df_raw.reset_index(drop=True)
+            df = normalize_cmx_a(df_raw)
+            missing = pd.Series(None, index=df.index, dtype=object)
+            created = df[COL_CREATED] if COL_CREATED in df.columns else missing
+            refund = df[COL_REFUND] if COL_REFUND in df.columns else missing
+            # 訂單日期 (選取區間用)：訂單建立時間無法解析時為 NULL
+            dates = _text(pd.to_datetime(created, errors='coerce', format='mixed').dt.strftime("%Y-%m-%d"))
+
+            with conn:
+                if existing:
+                    for table in ("cmx_rows", "cmx_refund_rows", "cmx_refund_columns", "cmx_files"):
+                        conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (existing[0],))
+                cur = conn.execute(
+                    "INSERT INTO cmx_files (file_id, stream, name, digest, rows, refunds, first_date, last_date, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (existing[0] if existing else None, stream, name, digest, len(df), int(refund.notna().sum()), dates.min() if dates.notna().any() else None,
+                     dates.max() if dates.notna().any() else None, datetime.now().isoformat(timespec="seconds")),
+                )
+                file_id = cur.lastrowid
+                if not df_ref.empty:
+                    # 退款原始列的訂單日期算法與上面相同 (沒有訂單建立時間欄時為 NULL，不會被選取)
+                    ref_created = _created_column(df_ref.columns)
+                    ref_dates = (_text(pd.to_datetime(df_ref[ref_created], errors='coerce', format='mixed').dt.strftime("%Y-%m-%d")).tolist()
+                                 if ref_created is not None else [None] * len(df_ref))
+                    conn.executemany(
+                        "INSERT INTO cmx_refund_columns VALUES (?, ?, ?, ?)",
+                        [(file_id, j, json.dumps(c, ensure_ascii=False), str(t)) for j, (c, t) in enumerate(df_ref.dtypes.items())],
+                    )
+                    conn.executemany(
+                        "INSERT INTO cmx_refund_rows VALUES (?, ?, ?, ?)",
+                        ((file_id, i, d, json.dumps([_cell(v) for v in row], ensure_ascii=False))
+                         for i, (d, row) in enumerate(zip(ref_dates, df_ref.astype(object).itertuples(index=False, name=None)))),
+                    )
+                conn.executemany(
+                    "INSERT INTO cmx_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    zip(
+                        [file_id] * len(df), df.index.tolist(), [stream] * len(df),
+                        df[COL_ID].tolist(), dates.tolist(), _stamp(created).tolist(),
+                        df[COL_PLATE].tolist(), df[COL_PHONE].tolist(), _stamp(refund).tolist(),
+                    ),
+                )
+            summaries.append({"name": name, "rows": len(df), "refunds": int(refund.notna().sum()), "skipped": False, "undated": int(dates.isna().sum())})
+    finally:
+        conn.close()
+    return summaries
+
+
+def select_rows(stream, start, end, path=None, chunk_rows=CHUNK_ROWS):
+    """
+    依匯入順序 (檔案、檔案內列序) 分批選取訂單日期介於 start ~ end (含) 的列，
+    產出 (DataFrame, 來源檔序號陣列)；來源檔序號對應 select_files() 回傳的檔案清單
+    """
+    import numpy as np
+    import pandas as pd
+
+    conn = connect(path)
+    try:
+        names = select_files(stream, start, end, conn=conn)
+        index = {file_id: i for i, (file_id, _) in enumerate(names)}
+        query = (
+            "SELECT file_id, order_id, created_at, plate, phone, refund_time FROM cmx_rows"
+            " WHERE stream = ? AND order_date BETWEEN ? AND ? ORDER BY file_id, row_no"
+        )
+        for chunk in pd.read_sql_query(query, conn, params=(check_stream(stream), check_date(start), check_date(end)), chunksize=chunk_rows):
+            file_index = np.array([index[f] for f in chunk.pop("file_id").tolist()], dtype=np.int64)
+            chunk.columns = [COL_ID, COL_CREATED, COL_PLATE, COL_PHONE, COL_REFUND]
+            for col in (COL_CREATED, COL_REFUND):
+                chunk[col] = _parse_stamp(chunk[col])
+            for col in (COL_PLATE, COL_PHONE):
+                chunk[col] = chunk[col].fillna("")
+            yield chunk[ROW_COLUMNS], file_index
+    finally:
+        conn.close()
+
+
+def select_refunds(stream, start, end, path=None):
+    """
+    訂單日期介於 start ~ end (含) 的退款列：匯出檔中的完整原始列 (欄位、型別與上傳 A 表時讀到的相同)，依匯入順序
+    """
+    import pandas as pd
+
+    start, end = check_date(start), check_date(end)
+    conn = connect(path)
+    try:
+        parts = []
+        for file_id, _ in select_files(stream, start, end, conn=conn):
+            spec = [(json.loads(name), dtype) for name, dtype in conn.execute(
+                "SELECT name, dtype FROM cmx_refund_columns WHERE file_id = ? ORDER BY col_no", (file_id,))]
+            if _created_column([name for name, _ in spec]) is None:
+                continue
+            rows = [json.loads(cells) for cells, in conn.execute(
+                "SELECT cells FROM cmx_refund_rows WHERE file_id = ? AND order_date BETWEEN ? AND ? ORDER BY row_no", (file_id, start, end))]
+            parts.append(_refund_frame(spec, rows))
+    finally:
+        conn.close()
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def select_files(stream, start, end, path=None, conn=None):
+    """
+    有列落在日期區間內的檔案 [(file_id, 檔名), ...] (依匯入順序)
+    """
+    own = conn is None
+    conn = conn or connect(path)
+    try:
+        return conn.execute(
+            "SELECT f.file_id, f.name FROM cmx_files f WHERE f.stream = ? AND EXISTS ("
+            " SELECT 1 FROM cmx_rows r WHERE r.file_id = f.file_id AND r.stream = f.stream AND r.order_date BETWEEN ? AND ?)"
+            " ORDER BY f.file_id",
+            (check_stream(stream), check_date(start), check_date(end)),
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+
+
+def lookup(order_id, path=None):
+    """
+    查詢單一訂單在資料庫中的所有列 (可能出現在多份匯出檔)
+    """
+    conn = connect(path)
+    try:
+        return conn.execute(
+            "SELECT r.stream, r.order_id, r.order_date, r.plate, r.phone, r.refund_time, f.name FROM cmx_rows r"
+            " JOIN cmx_files f ON f.file_id = r.file_id WHERE r.order_id = ? ORDER BY r.file_id, r.row_no",
+            (str(order_id).strip(),),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def coverage(path=None):
+    """
+    各類別已匯入的檔案數、列數與訂單日期範圍：{類別: (檔案數, 列數, 最早日期, 最晚日期)}
+    """
+    conn = connect(path)
+    try:
+        rows = conn.execute("SELECT stream, count(*), sum(rows), min(first_date), max(last_date) FROM cmx_files GROUP BY stream").fetchall()
+    finally:
+        conn.close()
+    return {stream: tuple(rest) for stream, *rest in rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CMX A 表歷史資料庫")
+    parser.add_argument("--db", default=ARCHIVE_DB, help="資料庫路徑 (預設為環境變數 CMX_ARCHIVE_DB)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="匯入 A 表匯出檔 (同一份檔案只會匯入一次)")
+    p.add_argument("--stream", choices=STREAMS, required=True, help="A 表類別")
+    p.add_argument("files", nargs="+")
+    sub.add_parser("list", help="列出已匯入的檔案與日期範圍")
+    p = sub.add_parser("lookup", help="查詢單一訂單")
+    p.add_argument("order_id")
+
+    args = parser.parse_args(argv)
+    if not args.db:
+        parser.error("請以 --db 或環境變數 CMX_ARCHIVE_DB 指定資料庫路徑")
+
+    if args.command == "ingest":
+        for s in ingest(args.files, args.stream, args.db):
+            if s["skipped"]:
+                print(f"⏭️ {s['name']}：已匯入過，略過")
+            else:
+                note = f"，{s['undated']} 筆無訂單建立時間 (無法依日期選取)" if s["undated"] else ""
+                print(f"✅ {s['name']}：{s['rows']} 筆 (含退款 {s['refunds']} 筆){note}")
+    elif args.command == "list":
+        conn = connect(args.db)
+        for row in conn.execute("SELECT stream, name, rows, refunds, first_date, last_date, ingested_at FROM cmx_files ORDER BY file_id"):
+            print("\t".join("" if v is None else str(v) for v in row))
+        conn.close()
+    else:
+        for row in lookup(args.order_id, args.db):
+            print("\t".join("" if v is None else str(v) for v in row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import argparse
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from exporters import DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS
+from instrument import recording
+from normalizers import DEFAULT_MATCH_MODE, NEW_VENDOR_MODE
+from readers import mp_context
+from results import cleanup_results
+
+# ==========================================
+# 命令列批次對帳：不經 Streamlit，直接以檔案路徑執行各對帳模式
+#
+#   python batch.py car-wash --wash A1.xlsx A2.xlsx --3in1 C.xlsx --billing B.xlsx [--vendor-mode] -o 輸出資料夾
+#   python batch.py litv A.xlsx B.xlsx -o 輸出資料夾
+#   python batch.py points 附件一.xlsx 附件二.xlsx -o 輸出資料夾
+#   python batch.py manifest jobs.json -o 輸出資料夾 [--workers 4]
+#   各模式皆可加 --format csv / csv-zip / parquet / xlsx-diff (預設 xlsx，見 exporters.py)
+#   洗車對帳可加 --state-db 狀態檔.sqlite [--vendor 廠商] [--period YYYY/MM]：跨月對帳 (見 state.py)
+#   洗車對帳可改用 --from YYYY-MM-DD --to YYYY-MM-DD [--archive 資料庫.sqlite]：A 表由歷史資料庫選取 (見 archive.py)，不需 --wash / --3in1
+#
+# manifest 為 JSON 陣列，每個元素是一組對帳 (路徑以 manifest 所在資料夾為基準)：
+#   {"mode": "car-wash", "wash": [...], "3in1": [...], "billing": "...", "vendor_mode": false}
+#   {"mode": "litv", "a": "...", "b": "..."}
+#   {"mode": "points", "a": "...", "b": "..."}
+# 可另加 "name"，作為輸出子資料夾名稱 (同月份多家廠商同名檔案時避免互相覆蓋)；
+# "export_format" 指定該組的輸出格式 (未指定時使用 --format)；
+# 洗車對帳另可加 "state_db" / "vendor" / "period" (未指定時使用 --state-db / --vendor / --period，廠商預設為 "name")，
+# 以及 "date_from" / "date_to" / "archive_db" (A 表由歷史資料庫選取，此時省略 "wash" / "3in1")
+# ==========================================
+
+MODES = ("car-wash", "litv", "points")
+
+
+class LocalFile(io.BytesIO):
+    """
+    將本機檔案包裝成與 Streamlit 上傳檔相同的介面 (name / size / seek / read)
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            super().__init__(fh.read())
+        self.name = os.path.basename(path)
+        self.size = len(self.getbuffer())
+
+
+class MemoryFile(io.BytesIO):
+    """
+    已在記憶體中的檔案內容 (例：Streamlit 上傳檔)，同樣提供 name / size，可序列化後交給子行程
+    """
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def _open(spec):
+    # job 內的檔案可為本機路徑或已開啟的檔案物件 (MemoryFile)
+    return spec if hasattr(spec, "read") else LocalFile(spec)
+
+
+def run_mode(job):
+    """
+    執行一組對帳，回傳對應 process_* 的完整結果 (第一項為檔案內容、第二項為 logs、最後一項為輸出檔名)
+    """
+    from reconcile import process_car_wash, process_litv, process_points
+
+    mode = job["mode"]
+    export_format = job.get("export_format") or DEFAULT_EXPORT_FORMAT
+    if mode == "car-wash":
+        match_mode = NEW_VENDOR_MODE if job.get("vendor_mode") else DEFAULT_MATCH_MODE
+        return process_car_wash(
+            [_open(p) for p in job.get("wash", [])],
+            [_open(p) for p in job.get("3in1", [])],
+            _open(job["billing"]),
+            match_mode,
+            export_format,
+            state_db=job.get("state_db"),
+            vendor=job.get("vendor") or job.get("name") or "",
+            period=job.get("period"),
+            archive_db=job.get("archive_db"),
+            date_range=(job["date_from"], job.get("date_to") or job["date_from"]) if job.get("date_from") else None,
+        )
+    if mode == "litv":
+        return process_litv(_open(job["a"]), _open(job["b"]), export_format)
+    if mode == "points":
+        return process_points(_open(job["a"]), _open(job["b"]), export_format)
+    raise ValueError(f"未知的對帳模式：{mode} (可用：{', '.join(MODES)})")
+
+
+def run_job(job):
+    """
+    執行一組對帳，回傳 (輸出檔名, results.ResultFile 或 None, logs)
+    """
+    out = run_mode(job)
+    return out[-1], out[0], out[1]
+
+
+def save_job(job, output_dir):
+    """
+    執行一組對帳並寫出結果活頁簿、.log.txt 與各階段量測 _metrics.json，回傳摘要 dict (子行程中執行，只回傳可序列化的內容)
+    """
+    out_dir = os.path.join(output_dir, job["name"]) if job.get("name") else output_dir
+    with recording() as recorder:
+        try:
+            filename, result, logs = run_job(job)
+        except Exception as e:
+            filename, result, logs = None, None, [f"❌ 程式執行錯誤: {str(e)}"]
+
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        stem = os.path.splitext(filename)[0] if filename else (job.get("name") or job["mode"])
+        log_path = os.path.join(out_dir, f"{stem}.log.txt")
+        with open(log_path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(str(l) for l in logs) + "\n")
+
+        metrics_path = os.path.join(out_dir, f"{stem}_metrics.json")
+        with open(metrics_path, "w", encoding="utf-8") as fh:
+            fh.write(recorder.to_json())
+
+        out_path = None
+        if result:
+            out_path = os.path.join(out_dir, filename)
+            result.move_to(out_path)
+    except BaseException:
+        # 輸出資料夾無法寫入等情況：結果檔不留在結果資料夾
+        if result:
+            result.delete()
+        raise
+    return {"name": job.get("name"), "mode": job["mode"], "ok": bool(result), "output": out_path, "log": log_path, "metrics": metrics_path}
+
+
+def load_manifest(path):
+    """
+    讀取 manifest，並將相對路徑轉為以 manifest 所在資料夾為基準的絕對路徑
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as fh:
+        jobs = json.load(fh)
+
+    def resolve(p):
+        return p if os.path.isabs(p) else os.path.join(base, p)
+
+    for job in jobs:
+        for key in ("a", "b", "billing", "state_db", "archive_db"):
+            if job.get(key):
+                job[key] = resolve(job[key])
+        for key in ("wash", "3in1"):
+            job[key] = [resolve(p) for p in job.get(key, [])]
+    return jobs
+
+
+def run_jobs(jobs, output_dir, workers=None):
+    """
+    以行程池執行多組對帳；結果依 manifest 順序回傳
+    """
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [save_job(job, output_dir) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context()) as executor:
+        return list(executor.map(save_job, jobs, [output_dir] * len(jobs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="自動對帳系統 - 命令列批次執行")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("car-wash", help="洗車與三合一對帳 (Code A)")
+    p.add_argument("--wash", nargs="*", default=[], help="洗車 A 表 (可多個)")
+    p.add_argument("--3in1", dest="three_in_one", nargs="*", default=[], help="三合一 A 表 (可多個)")
+    p.add_argument("--billing", required=True, help="TMS 請款明細 (B 表)")
+    p.add_argument("--vendor-mode", action="store_true", help="廠商新制 (手機後7碼-車牌)")
+    p.add_argument("--vendor", default=None, help="跨月對帳的廠商名稱 (狀態依廠商分開保存)")
+    p.add_argument("--from", dest="date_from", default=None, help="A 表改由歷史資料庫選取：訂單日期起日 YYYY-MM-DD")
+    p.add_argument("--to", dest="date_to", default=None, help="訂單日期迄日 YYYY-MM-DD (預設同起日)")
+
+    for name, help_text in (("litv", "LiTV 對帳 (Code B)"), ("points", "和泰點數對帳 (Code C)")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("a", help="A 表 / 附件一")
+        p.add_argument("b", help="B 表 / 附件二")
+
+    p = sub.add_parser("manifest", help="依 manifest (JSON) 批次執行多組對帳")
+    p.add_argument("path")
+    p.add_argument("--workers", type=int, default=None, help="同時執行的對帳組數 (預設為 CPU 數)")
+    p.add_argument("--vendor", default=None, help="跨月對帳的廠商名稱 (未指定時使用各組的 name)")
+
+    for p in (sub.choices["car-wash"], sub.choices["manifest"]):
+        p.add_argument("--state-db", default=None, help="跨月對帳狀態檔 (SQLite)，指定時只比對新增的列並列出跨月項目")
+        p.add_argument("--period", default=None, help="對帳月份 YYYY/MM (預設為本月)")
+        p.add_argument("--archive", dest="archive_db", default=None, help="A 表歷史資料庫 (預設 CMX_ARCHIVE_DB)")
+
+    for p in sub.choices.values():
+        p.add_argument("-o", "--output-dir", default=".", help="輸出資料夾 (預設為目前資料夾)")
+        p.add_argument("--format", dest="export_format", choices=list(EXPORT_FORMATS), default=DEFAULT_EXPORT_FORMAT, help="輸出格式 (預設 xlsx)")
+
+    args = parser.parse_args(argv)
+    # 結果檔會移到輸出資料夾；先清掉先前中斷的執行留在結果資料夾的過期檔案
+    cleanup_results()
+    if args.command == "manifest":
+        jobs = load_manifest(args.path)
+        if not jobs or any(job.get("mode") not in MODES for job in jobs):
+            parser.error(f"manifest 需為非空陣列，且每組的 mode 必須是 {', '.join(MODES)} 之一")
+        for job in jobs:
+            job.setdefault("export_format", args.export_format)
+            for key in ("state_db", "vendor", "period", "archive_db"):
+                if getattr(args, key) and not job.get(key):
+                    job[key] = getattr(args, key)
+        summaries = run_jobs(jobs, args.output_dir, args.workers)
+    else:
+        if args.command == "car-wash":
+            if args.date_from and (args.wash or args.three_in_one):
+                parser.error("--from / --to 與 --wash / --3in1 請擇一")
+            if not (args.wash or args.three_in_one or args.date_from):
+                parser.error("請至少指定一份 --wash 或 --3in1 A 表，或以 --from / --to 由歷史資料庫選取")
+            if args.date_to and not args.date_from:
+                parser.error("--to 需搭配 --from")
+            job = {"mode": "car-wash", "wash": args.wash, "3in1": args.three_in_one, "billing": args.billing, "vendor_mode": args.vendor_mode,
+                   "state_db": args.state_db, "vendor": args.vendor, "period": args.period,
+                   "archive_db": args.archive_db, "date_from": args.date_from, "date_to": args.date_to}
+        else:
+            job = {"mode": args.command, "a": args.a, "b": args.b}
+        job["export_format"] = args.export_format
+        summaries = [save_job(job, args.output_dir)]
+
+    for s in summaries:
+        status = "✅" if s["ok"] else "❌"
+        label = f"[{s['mode']}] {s['name']}" if s["name"] else f"[{s['mode']}]"
+        print(f"{status} {label} ➔ {s['output'] or '(未產生結果)'} (紀錄：{s['log']})")
+    return 0 if all(s["ok"] for s in summaries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
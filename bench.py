@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+# ==========================================
+# 效能量測：以 synthdata.py 產生的固定資料，量測各模式各階段 (read / normalize / merge / write) 的耗時與記憶體
+# 每一次量測都在新的子行程中執行 (快取與記憶體狀態一致)，結果才能前後比較
+#
+#   python bench.py --modes car-wash litv points --sizes 1000 10000 100000 --repeat 3 --json bench.json
+#   python bench.py --sizes 100000 --baseline bench_before.json     # 與上次結果比較，變慢超過門檻時結束碼為 1
+# ==========================================
+
+MODES = ("car-wash", "litv", "points")
+STAGES = ("read", "normalize", "merge", "write")
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def run_once(job, trace_memory=False):
+    """
+    在目前行程執行一次對帳，回傳 instrument 的量測結果 (各階段耗時 / 筆數 / 記憶體，讀寫位元組數)
+    """
+    import batch
+    import instrument
+
+    with instrument.recording(trace_memory=trace_memory) as recorder:
+        _, result, logs = batch.run_job(job)
+    metrics = recorder.as_dict()
+    # 只量測，不保留結果檔 (否則每次量測都在 RESULT_DIR 留下一份完整的活頁簿)
+    if result:
+        result.delete()
+    return {
+        "ok": bool(result),
+        "error": None if result else (logs[0] if logs else "unknown"),
+        "stages": metrics["stages"],
+        "total_seconds": metrics["total_seconds"],
+        "max_rss_bytes": metrics["max_rss_bytes"],
+        "bytes_read": metrics["bytes_read"],
+        "bytes_written": metrics["bytes_written"],
+    }
+
+
+def run_isolated(job, trace_memory=False):
+    """
+    在新的子行程中執行 run_once (避免前一次量測的快取與記憶體影響結果)
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "_run", json.dumps(job, ensure_ascii=False)]
+    if trace_memory:
+        cmd.append("--trace-memory")
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return {"ok": False, "error": (proc.stderr.strip().splitlines() or ["子行程失敗"])[-1], "stages": {}, "total_seconds": None, "max_rss_bytes": None}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_case(mode, rows, data_dir, repeat=3, seed=0, trace_memory=True):
+    """
+    量測一組 (模式, 筆數)：耗時取 repeat 次中的最小值，另跑一次 tracemalloc 取各階段記憶體峰值
+    """
+    import synthdata
+
+    job = synthdata.generate(mode, rows, os.path.abspath(data_dir), seed=seed)
+    # 結果一律記錄實際筆數 (LiTV / 點數超過單一工作表上限時會截斷)，要求的筆數另存 requested_rows
+    requested, rows = rows, job.pop("rows")
+    runs = [run_isolated(job) for _ in range(repeat)]
+    failed = next((r for r in runs if not r["ok"]), None)
+    if failed:
+        return {"mode": mode, "rows": rows, "requested_rows": requested, "ok": False, "error": failed["error"]}
+
+    stages = {}
+    for name in sorted({n for r in runs for n in r["stages"]}, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES)):
+        times = [r["stages"].get(name, {}).get("seconds", 0.0) for r in runs]
+        stages[name] = {"seconds": min(times), "seconds_all": times, "rows": runs[0]["stages"].get(name, {}).get("rows", {})}
+
+    if trace_memory:
+        traced = run_isolated(job, trace_memory=True)
+        for name, entry in traced.get("stages", {}).items():
+            stages.setdefault(name, {})["peak_traced_bytes"] = entry.get("peak_bytes")
+
+    return {
+        "mode": mode,
+        "rows": rows,
+        "requested_rows": requested,
+        "ok": True,
+        "total_seconds": min(r["total_seconds"] for r in runs),
+        "max_rss_bytes": max(r["max_rss_bytes"] or 0 for r in runs),
+        "bytes_read": runs[0]["bytes_read"],
+        "bytes_written": runs[0]["bytes_written"],
+        "stages": stages,
+    }
+
+
+def environment():
+    import numpy
+    import openpyxl
+    import pandas
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    與 baseline 逐項比較 (同模式、同筆數、同階段)，回傳變慢超過 threshold 比例的項目
+    """
+    base = {(c["mode"], c["rows"]): c for c in baseline.get("cases", []) if c.get("ok")}
+    regressions = []
+    for case in results["cases"]:
+        old = base.get((case["mode"], case["rows"]))
+        if not case.get("ok") or old is None:
+            continue
+        pairs = [("total", old["total_seconds"], case["total_seconds"])]
+        pairs += [(name, old["stages"].get(name, {}).get("seconds"), entry["seconds"]) for name, entry in case["stages"].items()]
+        for name, before, after in pairs:
+            # 太短的階段 (< 50ms) 容易受雜訊影響，不列入判斷
+            if before and after and max(before, after) >= 0.05 and after > before * (1 + threshold):
+                regressions.append({"mode": case["mode"], "rows": case["rows"], "stage": name, "before": before, "after": after})
+    return regressions
+
+
+def format_table(results):
+    lines = [f"{'mode':<10}{'rows':>10}{'total(s)':>10}" + "".join(f"{s + '(s)':>14}" for s in STAGES) + f"{'peak RSS(MB)':>14}"]
+    for case in results["cases"]:
+        if not case.get("ok"):
+            lines.append(f"{case['mode']:<10}{case['rows']:>10}  ❌ {case.get('error')}")
+            continue
+        cells = "".join(f"{case['stages'].get(s, {}).get('seconds', 0):>14.3f}" for s in STAGES)
+        lines.append(f"{case['mode']:<10}{case['rows']:>10}{case['total_seconds']:>10.3f}{cells}{case['max_rss_bytes'] / 1048576:>14.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_run":
+        # 子行程進入點 (run_isolated 使用)
+        print(json.dumps(run_once(json.loads(argv[1]), trace_memory="--trace-memory" in argv), ensure_ascii=False))
+        return 0
+
+    parser = argparse.ArgumentParser(description="自動對帳系統 - 效能量測")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="資料筆數 (1k ~ 5M)")
+    parser.add_argument("--repeat", type=int, default=3, help="每組量測次數，耗時取最小值")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="合成資料存放位置 (已產生過的檔案會沿用)")
+    parser.add_argument("--no-memory", action="store_true", help="不另跑 tracemalloc 量測")
+    parser.add_argument("--json", help="量測結果輸出路徑")
+    parser.add_argument("--baseline", help="與先前的量測結果比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="變慢超過此比例視為退步 (預設 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    import synthdata
+    from results import cleanup_results
+
+    # 清掉先前中斷的量測留下的過期結果檔
+    cleanup_results()
+    results = {"environment": environment(), "repeat": args.repeat, "seed": args.seed, "cases": []}
+    for mode in args.modes:
+        seen = set()
+        for rows in args.sizes:
+            actual = synthdata.actual_rows(mode, rows)
+            if actual != rows:
+                print(f"⚠️ {mode} 單一工作表最多 {actual} 筆，{rows} 筆改以 {actual} 筆量測", file=sys.stderr, flush=True)
+            if actual in seen:
+                continue
+            seen.add(actual)
+            print(f"⏱️ {mode} {actual} 筆 ...", file=sys.stderr, flush=True)
+            results["cases"].append(bench_case(mode, rows, args.data_dir, repeat=args.repeat, seed=args.seed, trace_memory=not args.no_memory))
+
+    print(format_table(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, ensure_ascii=False, indent=2)
+
+    status = 0 if all(c.get("ok") for c in results["cases"]) else 1
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        for r in regressions:
+            print(f"⚠️ 效能退步：{r['mode']} {r['rows']} 筆 [{r['stage']}] {r['before']:.3f}s ➔ {r['after']:.3f}s")
+        status = status or (1 if regressions else 0)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from progress import emit
+
+# ==========================================
+# 欄位式輸出：同一份對帳結果除了含格式的 xlsx，也可輸出 CSV / Parquet / 每張工作表一個 CSV 的 zip，
+# 下游程式或 BI 匯入不需要格式，省下產生 xlsx 的時間 (結果量大時 xlsx 佔大部分執行時間)
+# - CSV 以 utf-8-sig 編碼 (Excel 直接開啟不會變亂碼)，逐批寫入暫存檔，可搭配外部排序合併分批輸出
+# - Parquet 需要 pyarrow (選用套件)；各批先轉為 Arrow 表 (比 DataFrame 精簡許多)，結束時一次寫出
+# - 只有一張工作表時直接輸出該檔，多張時壓縮為 zip (每張工作表一個檔)
+# ==========================================
+
+EXPORT_FORMATS = {
+    "xlsx": "Excel 含格式 (全部工作表)",
+    "xlsx-diff": "Excel 含格式 (僅差異工作表)",
+    "csv": "CSV (僅差異工作表)",
+    "csv-zip": "CSV zip (全部工作表)",
+    "parquet": "Parquet (全部工作表)",
+}
+DEFAULT_EXPORT_FORMAT = "xlsx"
+
+# 暫存檔在記憶體中保留的上限，超過後自動轉存磁碟
+SPOOL_BYTES = 32 * 1024 * 1024
+
+MIME_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+    ".zip": "application/zip",
+    ".parquet": "application/vnd.apache.parquet",
+}
+
+
+def is_xlsx(fmt):
+    return fmt in ("xlsx", "xlsx-diff")
+
+
+def diff_only(fmt):
+    """
+    只輸出差異工作表 (不輸出完整比對總表等大型工作表)
+    """
+    return fmt in ("xlsx-diff", "csv")
+
+
+def check_format(fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知的輸出格式：{fmt} (可用：{', '.join(EXPORT_FORMATS)})")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("輸出 Parquet 需要安裝 pyarrow (pip install pyarrow)")
+
+
+def mime_type(filename):
+    return MIME_TYPES.get(os.path.splitext(filename or "")[1].lower(), "application/octet-stream")
+
+
+class _CsvSheet:
+    # 一張工作表 ➔ 一個 CSV：先寫標題列，之後每批 append 接續寫入
+    extension = ".csv"
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.rows = 0
+        self._file = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+        self._text = io.TextIOWrapper(self._file, encoding="utf-8-sig", newline="")
+        csv.writer(self._text, lineterminator="\n").writerow([str(c) for c in columns])
+
+    def append(self, df, *args, **kwargs):
+        # 與 writers.FrameSheet 相同的介面，xlsx 專用的列格式參數略過
+        df.to_csv(self._text, header=False, index=False, lineterminator="\n")
+        self.rows += len(df)
+        emit("write", self.name, rows=self.rows)
+
+    def write_to(self, fh):
+        self._text.flush()
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, fh)
+
+
+class _ParquetSheet:
+    # 一張工作表 ➔ 一個 Parquet 檔；各批欄位型別可能不同 (例：某批全為空值)，結束時再統一型別寫出
+    extension = ".parquet"
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.rows = 0
+        self.columns = [str(c) for c in columns]
+        self._tables = []
+
+    def append(self, df, *args, **kwargs):
+        import pyarrow as pa
+
+        self._tables.append(pa.Table.from_pandas(df, preserve_index=False))
+        self.rows += len(df)
+        emit("write", self.name, rows=self.rows)
+
+    def write_to(self, fh):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._tables:
+            table = pa.concat_tables(self._tables, promote_options="permissive")
+        else:
+            table = pa.Table.from_pandas(pd.DataFrame(columns=self.columns), preserve_index=False)
+        pq.write_table(table, fh)
+
+
+class TableExport:
+    """
+    以 CSV / Parquet 收集各工作表的結果 (sheet() 回傳的物件與 writers.FrameSheet 一樣可分批 append)，
+    最後以 save() 寫入輸出檔、filename() 取得對應副檔名的檔名
+    """
+
+    def __init__(self, fmt):
+        check_format(fmt)
+        self.fmt = fmt
+        self.sheets = []
+
+    def sheet(self, name, columns):
+        sheet = (_ParquetSheet if self.fmt == "parquet" else _CsvSheet)(name, columns)
+        self.sheets.append(sheet)
+        return sheet
+
+    def add(self, name, df):
+        sheet = self.sheet(name, df.columns)
+        sheet.append(df)
+        return sheet
+
+    def filename(self, filename):
+        stem = os.path.splitext(filename)[0]
+        if len(self.sheets) == 1:
+            return stem + self.sheets[0].extension
+        return stem + ".zip"
+
+    def save(self, output):
+        """
+        寫入輸出檔 (可寫入的檔案物件)；多張工作表時逐一壓縮進 zip，不在記憶體組出整份內容
+        """
+        if len(self.sheets) == 1:
+            self.sheets[0].write_to(output)
+            return
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+            for sheet in self.sheets:
+                with zf.open(sheet.name + sheet.extension, "w") as fh:
+                    sheet.write_to(fh)
@@ -0,0 +1,165 @@
+import contextvars
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，RSS 欄位留空
+    resource = None
+
+# ==========================================
+# 執行階段量測：各對帳流程以 stage("read") / stage("merge") 標記目前所在階段
+# 只有在 recording() 之內才會記錄，平常呼叫 stage() / count() / add_bytes() 不做任何事
+# ==========================================
+
+_ACTIVE = contextvars.ContextVar("instrument_recorder", default=None)
+
+STAGE_LABELS = {"read": "讀取", "normalize": "清理/正規化", "merge": "比對", "write": "寫入 Excel"}
+
+
+def _max_rss_bytes():
+    # 行程至今的 RSS 高水位；Linux 的 ru_maxrss 單位為 KB，macOS 為 bytes
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _fmt_bytes(n):
+    return f"{n / 1048576:,.1f} MB" if n >= 1048576 else f"{n / 1024:,.1f} KB"
+
+
+class RunRecorder:
+    """
+    每個階段累計：耗時 (秒)、筆數、RSS 高水位在該階段內的增加量、tracemalloc 峰值 (bytes)
+    同名階段重複出現時耗時與 RSS 增加量相加、峰值取最大；另記錄整次執行讀入與寫出的位元組數
+    (ru_maxrss 是行程至今的高水位，只會變大：階段結束時的值無法代表該階段，因此記錄進出階段之間的差值)
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._current = None
+        self._started = None
+        self._rss_started = None
+        self._run_started = time.perf_counter()
+        self.total_seconds = None
+
+    def _entry(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "rows": {}, "rss_growth_bytes": None, "peak_bytes": None})
+
+    def start(self, name):
+        self.stop()
+        self._current, self._started = name, time.perf_counter()
+        self._rss_started = _max_rss_bytes()
+        self._entry(name)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+    def stop(self):
+        if self._current is None:
+            return
+        entry = self._entry(self._current)
+        entry["seconds"] += time.perf_counter() - self._started
+        if self._rss_started is not None:
+            entry["rss_growth_bytes"] = (entry["rss_growth_bytes"] or 0) + _max_rss_bytes() - self._rss_started
+        if self.trace_memory:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, tracemalloc.get_traced_memory()[1])
+        self._current = None
+
+    def finish(self):
+        self.stop()
+        self.total_seconds = time.perf_counter() - self._run_started
+
+    def count(self, label, n):
+        if self._current is not None:
+            self._entry(self._current)["rows"][label] = int(n)
+
+    def as_dict(self):
+        return {
+            "total_seconds": self.total_seconds,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "max_rss_bytes": _max_rss_bytes(),
+            "stages": {name: dict(entry, rows=dict(entry["rows"])) for name, entry in self.stages.items()},
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=2)
+
+    def table(self):
+        """
+        轉為逐階段的表格資料 (list of dict)，供介面顯示
+        """
+        rows = []
+        for name, entry in self.stages.items():
+            rows.append({
+                "階段": STAGE_LABELS.get(name, name),
+                "耗時 (秒)": round(entry["seconds"], 3),
+                "筆數": "、".join(f"{k} {v:,}" for k, v in entry["rows"].items()),
+                "RSS 高水位增加 (MB)": round(entry["rss_growth_bytes"] / 1048576, 1) if entry["rss_growth_bytes"] is not None else None,
+                "RSS 高水位 (MB)": None,
+                "tracemalloc 峰值 (MB)": round(entry["peak_bytes"] / 1048576, 1) if entry["peak_bytes"] else None,
+            })
+        rows.append({
+            "階段": "合計",
+            "耗時 (秒)": round(self.total_seconds or 0.0, 3),
+            "筆數": f"讀入 {_fmt_bytes(self.bytes_read)}、寫出 {_fmt_bytes(self.bytes_written)}",
+            "RSS 高水位增加 (MB)": None,
+            "RSS 高水位 (MB)": round(_max_rss_bytes() / 1048576, 1) if resource else None,
+            "tracemalloc 峰值 (MB)": None,
+        })
+        return rows
+
+
+@contextmanager
+def recording(trace_memory=False):
+    """
+    在此區塊內執行的對帳流程會把各階段量測寫入回傳的 RunRecorder
+    trace_memory=True 時啟用 tracemalloc (會讓執行變慢，量測耗時與記憶體最好分開跑)
+    """
+    recorder = RunRecorder(trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _ACTIVE.set(recorder)
+    try:
+        yield recorder
+    finally:
+        recorder.finish()
+        _ACTIVE.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def stage(name):
+    """
+    標記進入 name 階段 (同時結束上一個階段)；不在 recording() 之內時不做任何事
+    """
+    recorder = _ACTIVE.get()
+    if recorder is not None:
+        recorder.start(name)
+
+
+def count(label, n):
+    """
+    記錄目前階段處理的筆數 (例：count("洗車 A表", len(df)))
+    """
+    recorder = _ACTIVE.get()
+    if recorder is not None:
+        recorder.count(label, n)
+
+
+def add_bytes(read=0, written=0):
+    """
+    累計讀入 / 寫出的位元組數
+    """
+    recorder = _ACTIVE.get()
+    if recorder is not None:
+        recorder.bytes_read += read
+        recorder.bytes_written += written
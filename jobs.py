@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from instrument import recording
+from progress import Progress, reporting
+from readers import file_size, mp_context
+from results import RESULT_TTL_SECONDS, cleanup_results
+
+# ==========================================
+# 背景對帳佇列：多位使用者同時送出大型對帳時，依序排隊交給有上限的行程池執行
+# - 同時執行的工作數不超過 JOB_WORKERS (預設為 CPU 數)
+# - 記憶體准入控制：依輸入檔大小估計每個工作的記憶體用量，
+#   執行中工作的估計總量加上新工作超過 JOB_MEMORY_MB 時，新工作留在佇列等待 (先到先執行，不插隊)
+#   佇列中沒有其他工作在執行時一律放行，單一超大工作仍可執行 (超大檔本身會改走串流 / 外部排序合併)
+# - 每個工作在獨立的子行程執行，結束後行程即回收，記憶體歸還系統；子行程異常終止只影響該工作
+# - 子行程的進度事件 (見 progress.py) 經由共用的事件佇列送回，累積在各工作的 Job.progress
+# - 結果檔由子行程直接寫入結果資料夾 (見 results.py)，只有路徑送回主行程；
+#   結束超過 RESULT_TTL_HOURS 的工作連同結果檔在下次送出工作時清除
+#
+#   JOB_WORKERS：同時執行的工作數上限
+#   JOB_MEMORY_MB：執行中工作的估計記憶體總量上限 (預設 2048)
+#   JOB_MEMORY_FACTOR：xlsx 檔案大小 ➔ 處理時記憶體用量的估計倍數 (預設 60)
+# ==========================================
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "0")) or os.cpu_count() or 1
+JOB_MEMORY_BYTES = int(os.environ.get("JOB_MEMORY_MB", "2048")) * 1024 * 1024
+JOB_MEMORY_FACTOR = float(os.environ.get("JOB_MEMORY_FACTOR", "60"))
+# 載入 pandas / openpyxl 後、尚未讀檔前的基本用量
+JOB_BASE_BYTES = 150 * 1024 * 1024
+
+QUEUED, RUNNING, DONE, FAILED = "排隊中", "執行中", "完成", "失敗"
+
+
+def job_files(job):
+    """
+    列出一組對帳 (batch.py 的 job 格式) 的所有輸入檔
+    """
+    return [f for key in ("wash", "3in1") for f in job.get(key, [])] + [job[key] for key in ("billing", "a", "b") if job.get(key)]
+
+
+def estimate_memory(job):
+    """
+    估計一組對帳執行時的記憶體用量 (bytes)
+    """
+    return JOB_BASE_BYTES + int(sum(file_size(f) for f in job_files(job)) * JOB_MEMORY_FACTOR)
+
+
+# 子行程內的事件佇列 (由 _init_worker 在行程啟動時設定)
+_EVENTS = None
+
+
+def _init_worker(events):
+    global _EVENTS
+    _EVENTS = events
+
+
+def _execute(job_id, job, trace_memory=False):
+    # 子行程進入點：回傳 (process_* 的完整結果, 各階段量測)；執行期間的進度事件以 (工作編號, 事件) 送回
+    from batch import run_mode
+
+    with reporting(lambda event: _EVENTS.put((job_id, event))), recording(trace_memory) as recorder:
+        out = run_mode(job)
+    return out, recorder
+
+
+class Job:
+    """
+    佇列中的一個對帳工作；output 為 process_* 的完整結果 tuple (完成後才有值)，progress 為執行中的即時進度
+    """
+
+    def __init__(self, job, owner=None, label=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.job = job
+        self.mode = job["mode"]
+        self.owner = owner
+        self.label = label or job.get("name") or job["mode"]
+        self.estimate = estimate_memory(job)
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.output = None
+        self.recorder = None
+        self.error = None
+        self.progress = Progress()
+
+    @property
+    def result(self):
+        return self.output[0] if self.output else None
+
+    @property
+    def logs(self):
+        if self.output:
+            return self.output[1]
+        return [self.error] if self.error else []
+
+    @property
+    def filename(self):
+        return self.output[-1] if self.output else None
+
+    def elapsed(self):
+        start = self.started_at or self.submitted_at
+        return (self.finished_at or time.time()) - start
+
+
+class JobQueue:
+    """
+    先進先出的對帳佇列 + 分派執行緒；submit() 立即回傳工作編號，之後以 get() / position() 查詢狀態
+    """
+
+    def __init__(self, workers=None, memory_bytes=None, trace_memory=False):
+        self.workers = workers or JOB_WORKERS
+        self.memory_bytes = JOB_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.trace_memory = trace_memory
+        self._jobs = {}
+        self._queue = []
+        self._running = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._events = mp_context().Queue()
+        self._listener = threading.Thread(target=self._listen, name="reconcile-progress", daemon=True)
+        self._listener.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="reconcile-dispatcher", daemon=True)
+        self._dispatcher.start()
+        cleanup_results()
+
+    def submit(self, job, owner=None, label=None):
+        """
+        送出一組對帳 (batch.py 的 job 格式，檔案可為路徑或 batch.MemoryFile)，回傳工作編號
+        """
+        self.expire()
+        record = Job(job, owner=owner, label=label)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("對帳佇列已關閉")
+            self._jobs[record.id] = record
+            self._queue.append(record.id)
+            self._cond.notify_all()
+        return record.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """
+        排隊順位 (1 = 下一個執行)；已開始或已結束的工作回傳 0
+        """
+        with self._cond:
+            return self._queue.index(job_id) + 1 if job_id in self._queue else 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": len(self._running),
+                "workers": self.workers,
+                "reserved_bytes": sum(self._jobs[i].estimate for i in self._running),
+                "memory_bytes": self.memory_bytes,
+            }
+
+    def jobs(self, owner=None):
+        """
+        依送出時間列出工作 (可只列出某位使用者的)
+        """
+        with self._cond:
+            return [j for j in self._jobs.values() if owner is None or j.owner == owner]
+
+    def forget(self, job_id):
+        """
+        移除已結束的工作 (含結果)；仍在排隊或執行中的工作不受影響
+        """
+        with self._cond:
+            record = self._jobs.get(job_id)
+            if record is None or record.status not in (DONE, FAILED):
+                return
+            del self._jobs[job_id]
+        if record.result:
+            record.result.delete()
+
+    def expire(self, max_age=None):
+        """
+        移除結束超過保留時間 (預設 RESULT_TTL_HOURS) 的工作並刪除結果檔，同時清掉結果資料夾中過期的檔案
+        """
+        max_age = RESULT_TTL_SECONDS if max_age is None else max_age
+        cutoff = time.time() - max_age
+        with self._cond:
+            expired = [r for r in self._jobs.values() if r.finished_at is not None and r.finished_at < cutoff]
+            for record in expired:
+                del self._jobs[record.id]
+        for record in expired:
+            if record.result:
+                record.result.delete()
+        cleanup_results(max_age)
+
+    def wait(self, job_id, timeout=None):
+        """
+        等待工作結束 (命令列或測試使用)，回傳該工作
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._jobs[job_id].status in (QUEUED, RUNNING):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            executors = list(self._running.values())
+            self._cond.notify_all()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._events.put(None)
+
+    def _admissible(self, record):
+        if len(self._running) >= self.workers:
+            return False
+        reserved = sum(self._jobs[i].estimate for i in self._running)
+        return not self._running or reserved + record.estimate <= self.memory_bytes
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._closed and not (self._queue and self._admissible(self._jobs[self._queue[0]])):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                record = self._jobs[self._queue.pop(0)]
+                record.status, record.started_at = RUNNING, time.time()
+                # 每個工作使用自己的單一子行程：結束後行程即回收、記憶體完整歸還；
+                # 子行程被系統終止 (例如記憶體不足) 也只影響這一個工作
+                executor = ProcessPoolExecutor(max_workers=1, mp_context=mp_context(), initializer=_init_worker, initargs=(self._events,))
+                self._running[record.id] = executor
+            future = executor.submit(_execute, record.id, record.job, self.trace_memory)
+            future.add_done_callback(lambda f, record=record: self._finish(record, f))
+
+    def _listen(self):
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            job_id, event = item
+            record = self._jobs.get(job_id)
+            if record is not None:
+                record.progress.update(event)
+
+    def _finish(self, record, future):
+        output = recorder = error = None
+        try:
+            output, recorder = future.result()
+        except BrokenProcessPool:
+            error = "❌ 執行對帳的子行程異常結束 (可能是記憶體不足)，請稍後重試或改用較小的檔案"
+        except Exception as e:
+            error = f"❌ 程式執行錯誤: {str(e)}"
+        with self._cond:
+            record.output, record.recorder, record.error = output, recorder, error
+            record.status = DONE if output and output[0] else FAILED
+            record.finished_at = time.time()
+            record.progress.finish()
+            record.job = None  # 釋放輸入檔內容
+            executor = self._running.pop(record.id, None)
+            self._cond.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=False)
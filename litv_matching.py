@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from keycodes import encode_keys
+from normalizers import to_text
+
+# ==========================================
+# LiTV 對帳：以查找表 + 整欄比對取代逐列 iterrows
+# ==========================================
+
+# A 表方案 -> B 表可接受的廠商對帳key1 (展開成一對一的查找表)
+SKU_MAPPING = pd.DataFrame(
+    [
+        ('LiTV_LUX_1Y_OT', 'LiTV_LUX_1Y_OT'),
+        ('LiTV_LUX_1Y_OT', 'LiTV_LUX_F1MF_1Y_OT'),
+        ('LiTV_LUX_1M_OT', 'LiTV_LUX_1M_OT'),
+    ],
+    columns=['sku', 'b_key'],
+)
+
+# B 表廠商對帳key1 -> A 表方案
+REVERSE_SKU_MAP = {'LiTV_LUX_F1MF_1Y_OT': 'LiTV_LUX_1Y_OT', 'LiTV_LUX_1Y_OT': 'LiTV_LUX_1Y_OT', 'LiTV_LUX_1M_OT': 'LiTV_LUX_1M_OT'}
+
+# A 表方案 -> CMX對帳明細 輸出的 (廠商方案代碼, 方案金額, 廠商方案名稱)；未列出的方案沿用原方案與 A 表金額
+SKU_OUTPUT = pd.DataFrame(
+    [
+        ('LiTV_LUX_1M_OT', 'LiTV_LUX_1M_OT', 187, '豪華雙享餐/月繳/單次(定價$250)'),
+        ('LiTV_LUX_1Y_OT', 'LiTV_LUX_F1MF_1Y_OT', 1717, '豪華雙享餐-首月免費/年繳/單次(定價$2,290)'),
+    ],
+    columns=['sku', 'out_sku', 'out_amt', 'out_name'],
+).set_index('sku')
+
+SHEET1_COLUMNS = ['廠商方案代碼', '廠商方案名稱', '手機/虛擬帳號', '方案金額', 'CMX訂單編號']
+
+
+def sku_text(series):
+    """
+    方案代碼轉字串並去空白；空值維持舊版 str(val) 的 "nan"
+    """
+    return to_text(series).str.strip().mask(series.isna(), "nan")
+
+
+def find_stop_index(series, marker="不計費"):
+    """
+    回傳第一個包含 marker 的列位置 (之後的資料不計費)，找不到則回傳 None
+    """
+    hits = np.flatnonzero(to_text(series).str.contains(marker, regex=False).to_numpy(dtype=bool))
+    return int(hits[0]) if len(hits) else None
+
+
+def pairs_isin(pairs, other_pairs):
+    """
+    (手機, 方案) 成對比對：兩側先編成共用的整數代碼，再以 np.isin 判斷是否存在
+    """
+    (codes, other_codes), _ = encode_keys(list(pairs), list(other_pairs))
+    return np.isin(codes, other_codes)
+
+
+def match_a_rows(phones_masked, skus, b_pairs):
+    """
+    A 表每列是否能在 B 表找到 (手機隱碼, 任一可接受的 key1)
+    """
+    a = pd.DataFrame({'row': np.arange(len(skus)), 'phone': np.asarray(phones_masked, dtype=object), 'sku': np.asarray(skus, dtype=object)})
+    expanded = a.merge(SKU_MAPPING, on='sku', how='left')
+    expanded['b_key'] = expanded['b_key'].fillna(expanded['sku'])
+    expanded['found'] = pairs_isin((expanded['phone'], expanded['b_key']), b_pairs)
+    return expanded.groupby('row', sort=True)['found'].any().to_numpy()
+
+
+def b_not_in_a(phones, keys, a_pairs):
+    """
+    B 表每列是否為「B有A無」：手機/虛擬帳號含 * 且 (手機, 對應的 A 方案) 不在 A 表
+    """
+    phones, keys = to_text(phones), to_text(keys)
+    a_sku = keys.map(REVERSE_SKU_MAP).fillna(keys)
+    return phones.str.contains('*', regex=False).to_numpy(dtype=bool) & ~pairs_isin((phones, a_sku), a_pairs)
+
+
+def build_cmx_sheet(df_a, b_pairs):
+    """
+    由 A 表 (需含 手機隱碼 / 手機全碼 / 方案(SKU) / 金額 / 訂單編號) 產生 CMX對帳明細 與 A有B無 清單
+    回傳 (CMX對帳明細 DataFrame，含 is_diff 欄；A有B無 DataFrame)
+    """
+    skus = sku_text(df_a['方案(SKU)'])
+    found = match_a_rows(df_a['手機隱碼'], skus, b_pairs)
+
+    out = SKU_OUTPUT.reindex(skus.to_numpy())
+    mapped = out['out_sku'].notna().to_numpy()
+    sheet1 = pd.DataFrame({
+        '廠商方案代碼': np.where(mapped, out['out_sku'].to_numpy(dtype=object), skus.to_numpy(dtype=object)),
+        '廠商方案名稱': np.where(mapped, out['out_name'].to_numpy(dtype=object), skus.to_numpy(dtype=object)),
+        '手機/虛擬帳號': df_a['手機隱碼'].to_numpy(dtype=object),
+        '方案金額': np.where(mapped, out['out_amt'].to_numpy(dtype=object), df_a['金額'].to_numpy(dtype=object)),
+        'CMX訂單編號': df_a['訂單編號'].to_numpy(dtype=object),
+        'is_diff': ~found,
+    })
+    diff_a = pd.DataFrame({
+        '手機號碼': df_a['手機全碼'].to_numpy(dtype=object),
+        '方案': skus.to_numpy(dtype=object),
+        '訂單編號': df_a['訂單編號'].to_numpy(dtype=object),
+    })[~found]
+    return sheet1, diff_a
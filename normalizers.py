@@ -0,0 +1,103 @@
+# ==========================================
+# 共用欄位正規化 (整欄向量化處理，各對帳模式共用)
+# ==========================================
+
+def to_text(series):
+    """
+    將整欄轉為字串，空值一律轉為空字串 ""
+    """
+    return series.astype(object).where(series.notna(), "").astype(str)
+
+
+def normalize_text(series):
+    """
+    轉為字串並去除前後空白
+    """
+    return to_text(series).str.strip()
+
+
+def normalize_order_id(series):
+    """
+    訂單編號 / 交易序號：轉為字串、去除空白與 Excel 數字產生的 .0
+    """
+    return normalize_text(series).str.replace(r'\.0$', '', regex=True)
+
+
+def normalize_phone(series):
+    """
+    將手機號碼轉為字串，去除 .0，並確保 09 開頭
+    """
+    s = normalize_order_id(series)
+    need_pad = (s.str.len() == 9) & s.str.startswith("9")
+    return s.mask(need_pad, "0" + s)
+
+
+def normalize_litv_phone(series):
+    """
+    LiTV A 表手機號碼：取小數點前的部分，9 碼一律補 0 (不限 9 開頭，與 normalize_phone 不同，沿用 LiTV 對帳原本的規則)
+    """
+    s = to_text(series).str.split('.').str[0]
+    return s.mask(s.str.len() == 9, "0" + s)
+
+
+def mask_phone(series):
+    """
+    手機隱碼：10 碼以上的號碼保留前 6 碼，其餘以 **** 取代 (例：091234****)
+    """
+    s = to_text(series)
+    return s.mask(s.str.len() >= 10, s.str[:6] + "****")
+
+
+def normalize_plate(series):
+    """
+    車牌：去除 - 與空白，並轉為大寫
+    """
+    return to_text(series).str.replace(r'[-\s]', '', regex=True).str.upper()
+
+
+def normalize_vendor_key(series):
+    """
+    廠商新制的比對鍵 (手機後7碼-車牌)：保留 -，只轉大寫並去除前後空白
+    """
+    return to_text(series).str.upper().str.strip()
+
+
+# ==========================================
+# 比對鍵產生 (A/B 兩側共用同一條路徑)
+# ==========================================
+DEFAULT_MATCH_MODE = "預設模式 (純車牌比對)"
+NEW_VENDOR_MODE = "廠商新制 (手機後7碼-車牌)"
+
+
+def phone_plate_key(phone, plate):
+    """
+    組出「手機後7碼-車牌」，手機不足 7 碼時保留完整號碼 (例：1234567-ABC1234)
+    """
+    return to_text(phone).str[-7:] + "-" + to_text(plate)
+
+
+def build_match_key(phone, plate, match_mode, vendor_composite=False):
+    """
+    依比對模式產生「比對用車牌」
+    vendor_composite=True 表示車牌欄位已是廠商提供的「手機後7碼-車牌」(B表)
+    """
+    if match_mode != NEW_VENDOR_MODE:
+        return normalize_plate(plate)
+    if vendor_composite:
+        return normalize_vendor_key(plate)
+    return phone_plate_key(phone, plate)
+
+
+# ==========================================
+# CMX A 表 (洗車 / 三合一) 正規化：洗車對帳與 A 表歷史資料庫 (archive.py) 共用同一套規則
+# ==========================================
+
+def normalize_cmx_a(df):
+    """
+    去除訂單編號空白的列，訂單編號 / 車牌 / 手機轉為比對用格式 (缺少車牌或手機欄位時補空字串)
+    """
+    df_cln = df.dropna(subset=['訂單編號']).copy()
+    df_cln['訂單編號'] = normalize_order_id(df_cln['訂單編號'])
+    df_cln['車牌'] = normalize_plate(df_cln['車牌']) if '車牌' in df_cln.columns else ""
+    df_cln['手機號碼'] = normalize_phone(df_cln['手機號碼']) if '手機號碼' in df_cln.columns else ""
+    return df_cln
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from normalizers import normalize_order_id
+
+# ==========================================
+# 點數歷程彙總：交易序號先正規化再編碼，以整數代碼做加總
+# ==========================================
+
+
+def sum_points_by_id(ids, points):
+    """
+    依正規化後的交易序號加總點數 (正負紀錄自然相抵)，交易序號空白的列不列入
+    回傳 (彙總表 [交易序號, 點數], 被合併的序號清單 [交易序號, 原始寫法])
+    被合併：同一個序號在原始檔案中以不同格式出現 (例：123.0 與 "123")，舊版 groupby 會拆成兩筆
+    """
+    ids = pd.Series(ids).reset_index(drop=True)
+    points = pd.Series(points).reset_index(drop=True)
+    present = ids.notna().to_numpy()
+    ids, points = ids[present], points[present]
+
+    codes, uniques = pd.factorize(normalize_order_id(ids), sort=True)
+    totals = np.bincount(codes, weights=points.to_numpy(dtype=np.float64), minlength=len(uniques))
+    if pd.api.types.is_integer_dtype(points.dtype):
+        totals = totals.astype(points.dtype)
+    df_sum = pd.DataFrame({'交易序號': uniques, '點數': totals})
+
+    # 原始值去重後 (123.0 與 "123" 視為不同值)，同一代碼仍有多種寫法者即為被合併的序號
+    raw_forms = pd.DataFrame({'code': codes, 'raw': ids.to_numpy(dtype=object)}).drop_duplicates()
+    raw_forms = raw_forms[raw_forms['code'].duplicated(keep=False).to_numpy()]
+    raw_forms['raw'] = raw_forms['raw'].map(repr)
+    df_collapsed = raw_forms.groupby('code', sort=True)['raw'].agg(' / '.join).reset_index()
+    df_collapsed = pd.DataFrame({'交易序號': uniques.take(df_collapsed['code']), '原始寫法': df_collapsed['raw'].to_numpy()})
+    return df_sum, df_collapsed
@@ -0,0 +1,102 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# ==========================================
+# 對帳進度事件：核心流程在讀取每份檔案 / 每張工作表、每次比對、每張輸出工作表寫出時 emit() 一個事件 (含筆數)，
+# logs 改用 ProgressLog，每加一行紀錄也同時送出；呼叫端以 reporting(callback) 接收，
+# 背景佇列 (jobs.py) 把事件從子行程送回介面，介面即時顯示進度條與紀錄 (本模組不依賴 Streamlit)
+# 不在 reporting() 之內時 emit() 不做任何事
+# ==========================================
+
+_SINK = contextvars.ContextVar("progress_sink", default=None)
+
+KIND_LABELS = {"read": "讀取", "sheet": "讀取工作表", "merge": "比對", "write": "寫出"}
+
+# 各類事件在進度條上所佔的區間 (讀檔通常最久)；進度只增不減
+KIND_SPANS = {"read": (0.0, 0.45), "sheet": (0.25, 0.5), "merge": (0.5, 0.7), "write": (0.7, 0.98)}
+
+
+@contextmanager
+def reporting(callback):
+    """
+    在此區塊內執行的對帳流程發出的事件 (dict) 會交給 callback
+    """
+    token = _SINK.set(callback)
+    try:
+        yield
+    finally:
+        _SINK.reset(token)
+
+
+def emit(kind, message, rows=None, done=None, total=None):
+    """
+    發出一個進度事件；kind 為 read / sheet / merge / write / log，
+    rows 為目前累計筆數，done / total 為同類項目的完成數 / 總數 (例：第 2 / 3 份檔案)
+    """
+    sink = _SINK.get()
+    if sink is not None:
+        sink({"kind": kind, "message": message, "rows": rows, "done": done, "total": total, "time": time.time()})
+
+
+class ProgressLog(list):
+    """
+    對帳流程的 logs：append / extend 時同時送出 log 事件
+    """
+
+    def append(self, line):
+        super().append(line)
+        emit("log", line)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def __reduce__(self):
+        # 送回主行程 / 寫入 pickle 時還原為一般 list
+        return list, (list(self),)
+
+
+def describe(event):
+    """
+    事件轉為一行說明文字 (例：「讀取 A.xlsx：12,345 筆 (1/2)」)
+    """
+    if event["kind"] == "log":
+        return str(event["message"])
+    text = f"{KIND_LABELS.get(event['kind'], event['kind'])} {event['message']}"
+    if event["rows"] is not None:
+        text += f"：{event['rows']:,} 筆"
+    if event["total"]:
+        text += f" ({event['done']}/{event['total']})"
+    return text
+
+
+class Progress:
+    """
+    累積一個工作收到的事件：fraction 為進度條位置 (0 ~ 1)，message 為最新進度說明，lines 為即時紀錄
+    """
+
+    def __init__(self):
+        self.fraction = 0.0
+        self.message = "準備中..."
+        self.lines = []
+        self.events = 0
+        self._partial = False
+
+    def update(self, event):
+        self.events += 1
+        if event["kind"] == "log":
+            self.lines.append(str(event["message"]))
+            return
+        self.message = describe(event)
+        lo, hi = KIND_SPANS.get(event["kind"], (0.0, 0.0))
+        if event["total"]:
+            lo += (hi - lo) * min(event["done"] / event["total"], 1.0)
+            self._partial = event["done"] < event["total"]
+        elif self._partial:
+            # 有總數的項目尚未完成 (例：分批比對之間穿插寫出)，進度條不跳到下一段
+            return
+        self.fraction = max(self.fraction, lo)
+
+    def finish(self):
+        self.fraction = 1.0
@@ -0,0 +1,638 @@
+import io
+import os
+import re
+import hashlib
+import pickle
+import stat
+import tempfile
+import threading
+import time
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
+
+from instrument import add_bytes
+
+# ==========================================
+# 共用 Excel 讀取：單次解析 + 自動偵測標題列
+# ==========================================
+
+def find_header_row(df_raw, predicate, default=0, max_scan=20):
+    """
+    在前 max_scan 列中，找出第一個符合 predicate 的列索引；找不到則回傳 default
+    predicate 接收該列去除空值後的字串清單
+    """
+    for i, row in enumerate(df_raw.head(max_scan).itertuples(index=False)):
+        row_vals = [str(x).strip() for x in row if pd.notna(x)]
+        if predicate(row_vals):
+            return i
+    return default
+
+
+def promote_header(df_raw, header_idx, schema=None):
+    """
+    將第 header_idx 列提升為欄位名稱，結果 (含欄名與型別推斷) 與 pd.read_excel(header=header_idx) 相同
+    df_raw 需以 header=None, dtype=object 讀入，保留儲存格原始值
+    schema 宣告的欄位不做型別推斷，直接依宣告轉型 (見 SCHEMA 說明)
+    """
+    df_rest = df_raw.iloc[header_idx:]
+    rows = df_rest.where(df_rest.notna(), "").values.tolist()
+    return _to_frame(rows[0] if rows else [], rows[1:], schema)
+
+
+def read_excel_with_header(src, predicate, sheet_name=0, default=0, max_scan=20, schema=None, **kwargs):
+    """
+    只解析工作表一次：以 header=None 讀入後在記憶體中尋找並提升標題列
+    回傳 (DataFrame, 標題列索引)
+    """
+    if hasattr(src, "parse"):
+        df_raw = src.parse(sheet_name=sheet_name, header=None, dtype=object, **kwargs)
+    else:
+        if hasattr(src, "seek"):
+            src.seek(0)
+        df_raw = pd.read_excel(src, sheet_name=sheet_name, header=None, dtype=object, **kwargs)
+    header_idx = find_header_row(df_raw, predicate, default=default, max_scan=max_scan)
+    return promote_header(df_raw, header_idx, schema), header_idx
+
+
+# ==========================================
+# 讀取型別宣告 (schema)：{欄名關鍵字: 型別}，讀取時直接轉型，不經 pandas 型別推斷
+# - ID：訂單編號 / 手機 / 交易序號一律為字串，不會被推斷成 float (不再出現 .0，長號碼也不失真)
+# - NUMERIC：點數 / 金額，無法轉換的值為 NaN
+# - DATETIME：退款時間 / 訂單建立時間；若有非空值無法解析成日期，整欄維持原始值 (不讓「有值」變成空值)
+# ==========================================
+ID, NUMERIC, DATETIME = "id", "numeric", "datetime"
+
+
+def schema_kind(name, schema):
+    """
+    回傳欄名對應的宣告型別 (欄名忽略空白後包含關鍵字即符合)，未宣告則回傳 None
+    """
+    if not schema:
+        return None
+    compact = _compact_name(name)
+    return next((kind for key, kind in schema.items() if _compact_name(key) in compact), None)
+
+
+def typed_column(values, kind):
+    """
+    依宣告型別將一欄原始儲存格值轉型；空字串與 None 視為空值
+    """
+    s = pd.Series(values, dtype=object)
+    missing = s.isna().to_numpy() | (s == "").to_numpy()
+    if kind == ID:
+        return s.astype(str).mask(missing)
+    if kind == NUMERIC:
+        return pd.to_numeric(s.mask(missing), errors='coerce')
+    if kind == DATETIME:
+        present = s.mask(missing)
+        looks_numeric = pd.to_numeric(present, errors='coerce').notna().any()
+        parsed = pd.to_datetime(present, errors='coerce', format='mixed')
+        if not looks_numeric and not (parsed.isna().to_numpy() & ~missing).any():
+            return parsed
+    return _typed_column(s.tolist())
+
+
+# ==========================================
+# 欄位投影讀取：只保留各模式宣告需要的欄位
+# ==========================================
+
+def _convert_value(val):
+    # 與 pandas 的 openpyxl 讀取器一致：空格為 ""、錯誤值為 NaN、整數值的 float 轉為 int
+    if val is None:
+        return ""
+    if isinstance(val, float):
+        return int(val) if val.is_integer() else val
+    if isinstance(val, str) and val in ERROR_CODES:
+        return float("nan")
+    return val
+
+
+def _is_blank(val):
+    # 串流引擎篩選用的空值判定：與 _convert_value 後的結果一致 (None / 空字串 / 錯誤值 #N/A 等皆為空)
+    val = _convert_value(val)
+    return val is None or (isinstance(val, str) and val == "") or (isinstance(val, float) and val != val)
+
+
+def _compact_name(name):
+    return re.sub(r'\s+', '', str(name))
+
+
+def _to_frame(names, rows, schema=None):
+    width = max([len(names)] + [len(r) for r in rows])
+    header = list(names) + [""] * (width - len(names))
+    data = [r + [""] * (width - len(r)) for r in rows]
+    kinds = [schema_kind(n, schema) for n in header]
+    if not any(kinds):
+        return TextParser([header] + data, header=0, skip_blank_lines=False).read()
+
+    # 欄名 (含重複欄名 .1 與 Unnamed) 仍由 TextParser 決定；只有未宣告的欄位交給型別推斷
+    columns = TextParser([header], header=0, skip_blank_lines=False).read().columns
+    inferred = [j for j, k in enumerate(kinds) if k is None]
+    df = TextParser([[header[j] for j in inferred]] + [[r[j] for j in inferred] for r in data], header=0, skip_blank_lines=False).read() if inferred else pd.DataFrame(index=range(len(data)))
+    df.columns = columns[inferred]
+    for j, kind in enumerate(kinds):
+        if kind is not None:
+            df[columns[j]] = typed_column([r[j] for r in data], kind).to_numpy()
+    return df[columns]
+
+
+def read_sheet_projected(src, columns, sheet_name=0, header=0, full_rows_when=None, schema=None):
+    """
+    以 openpyxl 唯讀模式逐列讀取，只保留欄名 (忽略空白) 包含 columns 任一關鍵字的欄位
+    full_rows_when 指定的欄位 (例：退款時間) 有值時，另外保留該列的完整內容
+    回傳 (投影後 DataFrame, 完整列 DataFrame)，型別推斷與 pd.read_excel 相同；schema 宣告的欄位直接轉型
+    """
+    data = src if isinstance(src, bytes) else file_bytes(src)
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        ws.reset_dimensions()
+
+        keywords = [_compact_name(c) for c in columns]
+        names, picks, full_idx = [], [], None
+        proj_rows, full_rows = [], []
+        last_row_with_data = -1
+
+        for row_number, row in enumerate(ws.iter_rows(values_only=True)):
+            if row_number < header:
+                continue
+            if row_number == header:
+                names = [_convert_value(v) for v in row]
+                while names and names[-1] == "":
+                    names.pop()
+                picks = [i for i, n in enumerate(names) if any(k in _compact_name(n) for k in keywords)]
+                if full_rows_when is not None:
+                    full_idx = next((i for i, n in enumerate(names) if _compact_name(n) == _compact_name(full_rows_when)), None)
+                continue
+
+            if any(v is not None for v in row):
+                last_row_with_data = len(proj_rows)
+            proj_rows.append([_convert_value(row[i]) if i < len(row) else "" for i in picks])
+            if full_idx is not None and full_idx < len(row) and row[full_idx] is not None:
+                full_rows.append((len(proj_rows) - 1, [_convert_value(v) for v in row]))
+    finally:
+        wb.close()
+
+    proj_rows = proj_rows[:last_row_with_data + 1]
+    full_rows = [r for i, r in full_rows if i <= last_row_with_data]
+    df = _to_frame([names[i] for i in picks], proj_rows, schema)
+    df_full = _to_frame(names, full_rows)
+    if full_idx is not None:
+        # 依 pandas 的空值判定再篩一次 (例如內容為 "N/A" 的儲存格)
+        df_full = df_full[df_full.iloc[:, full_idx].notna()].reset_index(drop=True)
+    return df, df_full
+
+
+# ==========================================
+# 串流讀取引擎：超大檔 (百萬列) 邊讀邊篩選，不先載入整張工作表
+# ==========================================
+
+def _typed_column(values):
+    # 由 pandas 建構子直接推斷精簡型別 (整數 / 浮點 / 字串 / 日期)，空格視為空值
+    return pd.Series([None if v == "" else v for v in values])
+
+
+def stream_sheet(src, columns, sheet_name=0, header=0, required=None, footer_pattern=None, split_when=None, schema=None, full_rows_when=None):
+    """
+    以 openpyxl 唯讀模式逐列串流，讀取時即完成篩選，只累積通過的列：
+    - split_when 欄位有值的列 (例：退款時間) 不進入結果，改以完整列另外回傳
+    - full_rows_when 欄位有值的列照常進入結果，另外也以完整列回傳 (同 read_sheet_projected)
+    - required 欄位 (例：訂單編號) 為空的列直接丟棄
+    - required 欄位符合 footer_pattern (例：合計|Total|總計) 的列直接丟棄
+    完全空白的列也會略過。回傳 (篩選後 DataFrame, 完整列 DataFrame)
+    schema 宣告的欄位直接轉型，其餘欄位由 pandas 推斷
+    """
+    return next(iter_sheet_chunks(src, columns, sheet_name=sheet_name, header=header, required=required,
+                                  footer_pattern=footer_pattern, split_when=split_when, schema=schema, full_rows_when=full_rows_when))
+
+
+def iter_sheet_chunks(src, columns, sheet_name=0, header=0, required=None, footer_pattern=None, split_when=None, schema=None, chunk_rows=None, full_rows_when=None):
+    """
+    與 stream_sheet 相同的篩選規則，但每累積 chunk_rows 列就產出一組 (篩選後 DataFrame, 完整列 DataFrame)
+    chunk_rows=None 時整張表只產出一組；至少產出一組 (空表時為空的 DataFrame，欄名仍保留)
+    未宣告型別的欄位在各區塊分別推斷，超大檔分段處理時建議以 schema 宣告比對需要的欄位
+    """
+    data = src if isinstance(src, bytes) else file_bytes(src)
+    footer_re = re.compile(footer_pattern, re.IGNORECASE) if footer_pattern else None
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        ws.reset_dimensions()
+
+        def find(name):
+            if name is None:
+                return None
+            return next((i for i, n in enumerate(names) if _compact_name(n) == _compact_name(name)), None)
+
+        keywords = [_compact_name(c) for c in columns]
+        names, picks, cols, split_rows = [], [], [], []
+        req_idx = split_idx = full_idx = None
+        emitted = False
+
+        for row_number, row in enumerate(ws.iter_rows(values_only=True)):
+            if row_number < header:
+                continue
+            if row_number == header:
+                names = [_convert_value(v) for v in row]
+                while names and names[-1] == "":
+                    names.pop()
+                picks = [i for i, n in enumerate(names) if any(k in _compact_name(n) for k in keywords)]
+                cols = [[] for _ in picks]
+                req_idx, split_idx, full_idx = find(required), find(split_when), find(full_rows_when)
+                continue
+
+            if split_idx is not None and split_idx < len(row) and not _is_blank(row[split_idx]):
+                split_rows.append([_convert_value(v) for v in row])
+                continue
+            if full_idx is not None and full_idx < len(row) and not _is_blank(row[full_idx]):
+                split_rows.append([_convert_value(v) for v in row])
+            if req_idx is not None:
+                key = row[req_idx] if req_idx < len(row) else None
+                if _is_blank(key):
+                    continue
+                if footer_re is not None and footer_re.search(str(key)):
+                    continue
+            if all(v is None for v in row):
+                continue
+            for values, i in zip(cols, picks):
+                values.append(_convert_value(row[i]) if i < len(row) else "")
+            if chunk_rows and len(cols[0] if cols else ()) >= chunk_rows:
+                yield _chunk_frames(names, picks, cols, split_rows, schema)
+                cols, split_rows = [[] for _ in picks], []
+                emitted = True
+    finally:
+        wb.close()
+
+    if not emitted or (cols and cols[0]) or split_rows:
+        yield _chunk_frames(names, picks, cols, split_rows, schema)
+
+
+def _chunk_frames(names, picks, cols, split_rows, schema):
+    col_names = _to_frame([names[i] for i in picks], []).columns
+    kinds = [schema_kind(names[i], schema) for i in picks]
+    df = pd.DataFrame({
+        name: typed_column(values, kind) if kind else _typed_column(values)
+        for name, values, kind in zip(col_names, cols, kinds)
+    }, columns=col_names)
+    return df, _to_frame(names, split_rows)
+
+
+def read_head_rows(src, sheet_name=0, nrows=20):
+    """
+    以唯讀模式只讀取前 nrows 列 (header=None, dtype=object)，供超大檔在串流前先找出標題列
+    列索引與 stream_sheet / iter_sheet_chunks 的 header 參數一致
+    """
+    data = src if isinstance(src, bytes) else file_bytes(src)
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        ws.reset_dimensions()
+        rows = [[None if v is None else _convert_value(v) for v in row] for row in ws.iter_rows(max_row=nrows, values_only=True)]
+    finally:
+        wb.close()
+    return pd.DataFrame(rows, dtype=object)
+
+
+# ==========================================
+# 多檔平行解析 (xlsx 解壓縮與解析屬 CPU 密集，分散到多個行程)
+# ==========================================
+
+def file_bytes(f):
+    """
+    取得上傳檔 (或本機路徑) 的完整位元組內容
+    """
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as fh:
+            data = fh.read()
+    else:
+        f.seek(0)
+        data = f.read()
+    add_bytes(read=len(data))
+    return data
+
+
+def file_size(f):
+    """
+    上傳檔 (或本機路徑) 的大小 (bytes)
+    """
+    if isinstance(f, (str, os.PathLike)):
+        return os.path.getsize(f)
+    size = getattr(f, "size", None)
+    if size is None:
+        size = len(f.getbuffer()) if hasattr(f, "getbuffer") else len(file_bytes(f))
+    return size
+
+
+def is_large_file(f):
+    """
+    檔案大小超過 STREAM_THRESHOLD_MB 時，改走串流讀取引擎
+    """
+    return file_size(f) > STREAM_THRESHOLD_BYTES
+
+
+def _read_excel_bytes(data, kwargs):
+    if kwargs.get("engine") == "stream":
+        return stream_sheet(data, **{k: v for k, v in kwargs.items() if k != "engine"})
+    if "columns" in kwargs:
+        return read_sheet_projected(data, **kwargs)
+    return pd.read_excel(io.BytesIO(data), **kwargs)
+
+
+def mp_context():
+    # Streamlit 伺服器本身是多執行緒，避免直接 fork
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def read_excel_files(files, max_workers=None, cache=None, **kwargs):
+    """
+    以行程池平行解析多個 Excel 檔，回傳的 DataFrame 清單維持上傳順序
+    有指定 columns 時改用 read_sheet_projected，每個檔案回傳 (投影, 完整列) 兩個 DataFrame
+    engine="stream" 時改用 stream_sheet，同樣回傳兩個 DataFrame
+    已解析過的檔案直接取用快取；單一檔案時直接在本行程解析
+    """
+    cache = PARSE_CACHE if cache is None else cache
+    payloads = [file_bytes(f) for f in files]
+    keys = [cache_key(content_digest(data), **kwargs) for data in payloads]
+    results = [cache.get(key) for key in keys]
+    misses = [i for i, df in enumerate(results) if df is None]
+
+    workers = min(len(misses), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        parsed = [_read_excel_bytes(payloads[i], kwargs) for i in misses]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context()) as executor:
+            parsed = list(executor.map(_read_excel_bytes, [payloads[i] for i in misses], repeat(kwargs)))
+
+    for i, df in zip(misses, parsed):
+        cache.put(keys[i], df)
+        results[i] = _copy(df)
+    return results
+
+
+# ==========================================
+# 解析結果快取 (以檔案內容雜湊為鍵，LRU 淘汰，限制總記憶體)
+# Streamlit 每次互動都會重跑，同一份檔案不必重新解析
+# 背景佇列的每個工作都在新的子行程執行 (見 jobs.py)，行程內的快取無法留到下一次：
+# 另以本機資料夾保存解析結果 (pickle)，各行程共用，同一份檔案第二次對帳時直接載入
+# - 資料夾放在使用者自己的快取目錄 (不是共用的系統暫存資料夾)；不是目前使用者擁有、或權限不是 0700 時不使用
+# - 內容含客戶資料 (手機、車牌、訂單編號)：寫入超過 PARSE_CACHE_TTL_HOURS 的檔案一律刪除，與結果檔相同
+#
+#   PARSE_CACHE_MB：行程內快取的記憶體上限 (預設 512)
+#   PARSE_CACHE_DIR：磁碟快取資料夾 (預設為 $XDG_CACHE_HOME 或 ~/.cache 下的 reconcile/parse)
+#   PARSE_CACHE_DISK_MB：磁碟快取總量上限，超過時先刪除最早寫入的檔案 (預設 2048，設為 0 停用磁碟快取)
+#   PARSE_CACHE_TTL_HOURS：磁碟快取保留時數 (預設 24)
+# ==========================================
+
+PARSE_CACHE_DIR = os.environ.get("PARSE_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "reconcile", "parse")
+PARSE_CACHE_DISK_BYTES = int(os.environ.get("PARSE_CACHE_DISK_MB", "2048")) * 1024 * 1024
+PARSE_CACHE_TTL_SECONDS = float(os.environ.get("PARSE_CACHE_TTL_HOURS", "24")) * 3600
+# 解析結果的格式改變時 (讀取規則、欄位型別) 調高版本，舊的磁碟快取自動失效
+PARSE_CACHE_VERSION = 1
+
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cache_key(digest, **params):
+    return (digest, repr(sorted(params.items())))
+
+
+def _estimate_bytes(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, tuple):
+        return sum(_estimate_bytes(x) for x in obj)
+    return 1024
+
+
+def _copy(obj):
+    if isinstance(obj, tuple):
+        return tuple(x.copy() for x in obj)
+    return obj.copy()
+
+
+class ParseCache:
+    """
+    已解析 DataFrame 的 LRU 快取，總用量超過 max_bytes 時淘汰最久未使用的項目
+    取出時一律回傳複本，呼叫端可放心修改
+    指定 directory 時另有磁碟層：記憶體沒有的項目改從磁碟載入，新項目同時寫入磁碟 (總量上限 disk_bytes，保留 ttl 秒)
+    磁碟快取只是加速，讀寫失敗 (檔案損毀、空間不足、資料夾不安全) 一律視為沒有快取
+    """
+
+    def __init__(self, max_bytes, directory=None, disk_bytes=0, ttl=PARSE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.directory = directory if disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self._swept = False
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _secure_directory(self):
+        """
+        建立 (或確認) 磁碟快取資料夾：必須是目前使用者擁有、權限 0700 的資料夾 (不接受符號連結)
+        其他使用者可寫入的資料夾可能被放入惡意 pickle 檔，不符合時本次不使用磁碟快取
+        """
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            st = os.lstat(self.directory)
+        except OSError:
+            return False
+        if not stat.S_ISDIR(st.st_mode) or stat.S_IMODE(st.st_mode) != 0o700:
+            return False
+        return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+    def _disk_path(self, key):
+        # 檔名含快取版本與 pandas 版本：升級後舊檔不會被誤用 (pickle 不保證跨版本相容)
+        name = hashlib.blake2b(repr((PARSE_CACHE_VERSION, pd.__version__, key)).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"parse_{name}.pkl")
+
+    def _load(self, key):
+        if not self._secure_directory():
+            return None
+        if not self._swept:
+            self._swept = True
+            self._trim_disk()
+        path = self._disk_path(key)
+        try:
+            # 保留時間以寫入時間計算 (讀取不延長)，過期的項目不再使用
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                self._remove(path)
+                return None
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._remove(path)
+            return None
+        return value
+
+    def _save(self, key, value, size):
+        if size > self.disk_bytes:
+            return
+        if not self._secure_directory():
+            return
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(prefix="tmp_", dir=self.directory)
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            # 先寫入暫存檔再改名：同時執行的其他工作不會讀到寫一半的檔案
+            os.replace(tmp, self._disk_path(key))
+        except OSError:
+            self._remove(tmp)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        # 先刪除超過保留時間的檔案，總量仍超過上限時再依寫入時間由舊到新刪除
+        cutoff = time.time() - self.ttl
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith("parse_"):
+                    info = entry.stat()
+                    entries.append((info.st_mtime, info.st_size, entry.path))
+            except FileNotFoundError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.disk_bytes and mtime >= cutoff:
+                continue
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                value, _ = self._items[key]
+                return _copy(value)
+        if self.directory is None:
+            return None
+        value = self._load(key)
+        if value is None:
+            return None
+        self._remember(key, value, _estimate_bytes(value))
+        return _copy(value)
+
+    def put(self, key, value):
+        size = _estimate_bytes(value)
+        if self.directory is not None:
+            self._save(key, value, size)
+        self._remember(key, value, size)
+
+    def _remember(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.total_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        # 只清除記憶體層；磁碟快取依 PARSE_CACHE_DISK_MB 自行淘汰
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+STREAM_THRESHOLD_BYTES = int(os.environ.get("STREAM_THRESHOLD_MB", "20")) * 1024 * 1024
+
+PARSE_CACHE = ParseCache(
+    max_bytes=int(os.environ.get("PARSE_CACHE_MB", "512")) * 1024 * 1024,
+    directory=PARSE_CACHE_DIR,
+    disk_bytes=PARSE_CACHE_DISK_BYTES,
+)
+
+
+class CachedWorkbook:
+    """
+    取代 pd.ExcelFile 的上傳檔包裝：sheet_names 與 parse() 結果都經過 PARSE_CACHE
+    只有在快取未命中時才真正開啟活頁簿
+    """
+
+    def __init__(self, src, cache=None):
+        self.data = file_bytes(src)
+        self.name = getattr(src, "name", os.path.basename(str(src)))
+        self.digest = content_digest(self.data)
+        self.cache = PARSE_CACHE if cache is None else cache
+        self._book = None
+
+    @property
+    def book(self):
+        if self._book is None:
+            self._book = pd.ExcelFile(io.BytesIO(self.data))
+        return self._book
+
+    @property
+    def sheet_names(self):
+        key = cache_key(self.digest, sheet_names=True)
+        names = self.cache.get(key)
+        if names is None:
+            names = list(self.book.sheet_names)
+            self.cache.put(key, names)
+        return list(names)
+
+    def parse(self, sheet_name=0, **kwargs):
+        key = cache_key(self.digest, sheet_name=sheet_name, **kwargs)
+        df = self.cache.get(key)
+        if df is None:
+            df = self.book.parse(sheet_name=sheet_name, **kwargs)
+            self.cache.put(key, df)
+            df = df.copy()
+        return df
+
+    def parse_columns(self, columns, sheet_name=0, header=0, schema=None):
+        """
+        只讀取宣告的欄位 (見 read_sheet_projected)，同樣經過快取
+        """
+        key = cache_key(self.digest, columns=list(columns), sheet_name=sheet_name, header=header, schema=schema)
+        df = self.cache.get(key)
+        if df is None:
+            df, _ = read_sheet_projected(self.data, columns, sheet_name=sheet_name, header=header, schema=schema)
+            self.cache.put(key, df)
+            df = df.copy()
+        return df
+
+    def stream(self, columns, sheet_name=0, header=0, **filters):
+        """
+        串流讀取並在讀取時篩選 (見 stream_sheet)，只回傳篩選後的 DataFrame
+        """
+        key = cache_key(self.digest, engine="stream", columns=list(columns), sheet_name=sheet_name, header=header, **filters)
+        df = self.cache.get(key)
+        if df is None:
+            df, _ = stream_sheet(self.data, columns, sheet_name=sheet_name, header=header, **filters)
+            self.cache.put(key, df)
+            df = df.copy()
+        return df
+
+    @property
+    def is_large(self):
+        return len(self.data) > STREAM_THRESHOLD_BYTES
@@ -0,0 +1,915 @@
+import pandas as pd
+import numpy as np
+import os
+from contextlib import nullcontext
+from datetime import datetime
+from readers import read_excel_with_header, read_excel_files, read_head_rows, find_header_row, promote_header, iter_sheet_chunks, file_bytes, is_large_file, CachedWorkbook, ID, NUMERIC, DATETIME
+from xlsx_patch import XlsxPatcher, font_xml, solid_fill_xml
+from writers import excel_writer, frame_rows, row_formats, write_rows, write_frame, FrameSheet
+from normalizers import normalize_order_id, normalize_phone, normalize_litv_phone, mask_phone, normalize_text, build_match_key, normalize_cmx_a
+from keycodes import encode_keys, duplicate_keys, key_fingerprint, merge_on_codes
+from points_ledger import sum_points_by_id
+from litv_matching import SHEET1_COLUMNS, build_cmx_sheet, b_not_in_a, find_stop_index
+from sortmerge import KEY_COL, BLOCK_ROWS, MERGE_MEMORY_BYTES, RunSpiller, iter_key_batches, sort_key, spill_directory, use_sort_merge
+from instrument import stage, count, add_bytes
+from progress import emit, ProgressLog
+from exporters import DEFAULT_EXPORT_FORMAT, TableExport, check_format, diff_only, is_xlsx
+from results import ResultBuffer
+from state import StateStore, check_period
+from archive import COL_CREATED, check_date, select_files, select_refunds, select_rows
+
+# 各對帳模式的核心流程 (不依賴 Streamlit)：views.py (app.py / app01.py) 的介面與 batch.py 命令列共用
+# 輸入檔可為 Streamlit 上傳檔，或任何具備 name / seek / read 的檔案物件 (見 batch.LocalFile)
+# 輸出檔直接寫入結果資料夾，回傳的第一項為 results.ResultFile (失敗時為 None)
+
+# ==========================================
+# 🚗 功能 A：洗車與三合一對帳邏輯
+# ==========================================
+def process_car_wash(files_wash_a, files_3in1_a, file_billing_upload, match_mode, export_format=DEFAULT_EXPORT_FORMAT, state_db=None, vendor="", period=None, archive_db=None, date_range=None):
+    # state_db：跨月對帳狀態檔 (見 state.py)，指定時依 (廠商 vendor, 對帳月份 period) 只比對新增的列並列出跨月項目
+    # date_range：(起日, 迄日)，指定時 A 表改由歷史資料庫 archive_db (見 archive.py，預設 CMX_ARCHIVE_DB) 選取，不需上傳
+    output = ResultBuffer()
+    logs = ProgressLog()
+    store = None
+    output_filename = "洗車與三合一_對帳結果.xlsx"
+
+    try:
+        check_format(export_format)
+        if date_range:
+            if files_wash_a or files_3in1_a:
+                raise ValueError("A 表請擇一：上傳檔案，或由歷史資料庫選取日期區間")
+            date_range = (check_date(date_range[0]), check_date(date_range[1]))
+        if file_billing_upload:
+            base_name = os.path.splitext(file_billing_upload.name)[0]
+            output_filename = f"{base_name}_CMX確認.xlsx"
+
+        file_billing_upload.seek(0)
+
+        col_id = '訂單編號'
+        col_plate = '車牌'
+        col_refund = '退款時間'
+        col_phone = '手機號碼'
+        col_file = '_來源檔'  # 外部排序合併時記錄 A 表各列的來源檔序號 (統計各檔重複數)
+        a_columns = [col_id, col_plate, col_refund, col_phone]
+        b_columns = [col_id, col_plate, col_phone]
+        # 讀取時即宣告型別：訂單編號 / 車牌 / 手機為字串，退款時間為日期
+        a_schema = {col_id: ID, col_plate: ID, col_phone: ID, col_refund: DATETIME}
+        b_schema = {col_id: ID, col_plate: ID, col_phone: ID}
+        target_month_str = check_period(period) if period else datetime.now().strftime("%Y/%m")
+        if state_db:
+            store = StateStore(state_db, "car-wash", vendor, target_month_str)
+            logs.append(f"🗓️ 跨月對帳：廠商「{vendor or '未指定'}」，對帳月份 {target_month_str} (狀態檔 {os.path.basename(state_db)})")
+
+        def clean_a(df_filtered, normalized=False):
+            # 已排除退款列的 A 表：正規化訂單編號 / 車牌 / 手機並產生比對鍵 (逐列運算，可分批處理)
+            # 正規化規則與 A 表歷史資料庫共用 (normalizers.normalize_cmx_a)；由資料庫選取的列已正規化
+            df_cln = df_filtered.copy() if normalized else normalize_cmx_a(df_filtered)
+            df_cln['比對用車牌'] = build_match_key(df_cln[col_phone], df_cln[col_plate], match_mode)
+            return df_cln
+
+        def log_duplicates(side, names, per_file):
+            # 依 訂單編號 + 比對用車牌 去除的重複列數 (廠商重複請款會反映在這裡)，有多份檔案時逐檔列出
+            total = int(sum(per_file))
+            line = f"   ↳ 【{side}】依 訂單編號+比對用車牌 去除重複 {total} 筆"
+            if len(names) > 1:
+                line += "：" + "、".join(f"{name} {int(n)} 筆" for name, n in zip(names, per_file))
+            logs.append(line)
+            count(f"{side} 重複", total)
+
+        def dedup_a(df_cln, file_index, n_files):
+            # file_index：各列的來源檔序號；回傳 (去重後的 A 表, 各檔被去除的重複列數)
+            # 跨檔重複時保留先出現的一筆，重複數計入後出現的檔案
+            dup = duplicate_keys(df_cln[col_id], df_cln['比對用車牌'])
+            return df_cln[~dup], np.bincount(np.asarray(file_index, dtype=np.int64)[dup], minlength=n_files)
+
+        def finish_a(df_filtered, file_of_row, names, label, normalized=False):
+            # 正規化 + 去重；file_of_row 以 df_filtered 的索引查回各列的來源檔 (names 的序號)
+            df_cln = clean_a(df_filtered, normalized)
+            df_cln, dup_per_file = dedup_a(df_cln, file_of_row[df_cln.index.to_numpy()], len(names))
+            log_duplicates(f"{label} A表", names, dup_per_file)
+            logs.append(f"   ↳ 【{label} A表】合併去重後，共 {len(df_cln)} 筆有效資料")
+            count(f"{label} A表有效", len(df_cln))
+            return df_cln
+
+        def archived_files(label):
+            names = [name for _, name in select_files(label, *date_range, path=archive_db)]
+            logs.append(f"📂 由歷史資料庫選取【{label} A表】{date_range[0]} ~ {date_range[1]}，共 {len(names)} 份匯出檔...")
+            return names
+
+        def prepare_archived_a(label):
+            # A 表由歷史資料庫 (archive.py) 選取：已正規化，不需解析 xlsx；回傳格式與 prepare_a_data 相同
+            stage("read")
+            names = archived_files(label)
+            parts = list(select_rows(label, *date_range, path=archive_db))
+            if not parts:
+                return pd.DataFrame(), pd.DataFrame()
+            df_raw = pd.concat([p[0] for p in parts], ignore_index=True)
+            file_of_row = np.concatenate([p[1] for p in parts])
+            for name, n in zip(names, np.bincount(file_of_row, minlength=len(names))):
+                logs.append(f"   ↳ 成功選取: {name} ({n} 筆)")
+            emit("read", f"{label} A表 (歷史資料庫)", rows=len(df_raw), done=1, total=1)
+            count(f"{label} A表", len(df_raw))
+            stage("normalize")
+
+            refund = df_raw[col_refund].notna().to_numpy()
+            df_cln = finish_a(df_raw[~refund].drop(columns=[COL_CREATED]), file_of_row, names, label, normalized=True)
+            # 退款排除名單使用匯出檔的完整原始列 (與上傳 A 表時相同)
+            return df_cln, select_refunds(label, *date_range, path=archive_db)
+
+        def prepare_a_data(file_list, label):
+            if date_range:
+                return prepare_archived_a(label)
+            if not file_list: 
+                return pd.DataFrame(), pd.DataFrame()
+                
+            stage("read")
+            logs.append(f"📂 正在讀取【{label} A表】，共 {len(file_list)} 份檔案...")
+            # 比對只需要 a_columns；退款列另外保留完整內容，供「A表退款排除名單」使用
+            if any(is_large_file(f) for f in file_list):
+                logs.append("   ⚡ 檔案較大，改用串流讀取 (讀取時即排除退款與空白訂單編號)")
+                results = read_excel_files(file_list, sheet_name=0, header=2, engine="stream", columns=a_columns, schema=a_schema, required=col_id, split_when=col_refund)
+            else:
+                results = read_excel_files(file_list, sheet_name=0, header=2, columns=a_columns, schema=a_schema, full_rows_when=col_refund)
+            for i, (f, (df_temp, _)) in enumerate(zip(file_list, results), 1):
+                logs.append(f"   ↳ 成功讀取: {f.name} ({len(df_temp)} 筆)")
+                emit("read", f"{label} A表 {f.name}", rows=len(df_temp), done=i, total=len(file_list))
+                
+            df_raw = pd.concat([r[0] for r in results], ignore_index=True)
+            # df_raw 的索引即列位置，之後篩選保留原索引，可由此查回每列的來源檔
+            file_of_row = np.repeat(np.arange(len(file_list)), [len(r[0]) for r in results])
+            count(f"{label} A表", len(df_raw))
+            stage("normalize")
+
+            df_ref = pd.DataFrame()
+            if col_refund in df_raw.columns:
+                df_ref = pd.concat([r[1] for r in results], ignore_index=True)
+                df_filtered = df_raw[df_raw[col_refund].isna()]
+            else:
+                df_filtered = df_raw
+
+            df_cln = finish_a(df_filtered, file_of_row, [f.name for f in file_list], label)
+            return df_cln, df_ref
+
+        def spill_archived_a(label, spill_dir):
+            # 外部排序合併 + 歷史資料庫：逐批選取已正規化的列寫入 run 檔
+            spiller = RunSpiller(spill_dir, f"{label}_A")
+            names = archived_files(label)
+            df_ref = select_refunds(label, *date_range, path=archive_db)
+            refunds = [] if df_ref.empty else [df_ref]
+            n_rows = 0
+            for df_chunk, file_index in select_rows(label, *date_range, path=archive_db, chunk_rows=BLOCK_ROWS):
+                stage("normalize")
+                n_rows += len(df_chunk)
+                emit("read", f"{label} A表 (歷史資料庫)", rows=n_rows)
+                refund = df_chunk[col_refund].notna().to_numpy()
+                df_cln = clean_a(df_chunk[~refund].drop(columns=[COL_CREATED]), normalized=True)
+                spiller.add(df_cln.assign(**{KEY_COL: sort_key(df_cln[col_id], df_cln['比對用車牌']), col_file: file_index[~refund]}))
+                stage("read")
+            logs.append(f"   ↳ 成功選取 {n_rows} 筆")
+            count(f"{label} A表", n_rows)
+            runs = spiller.close()
+            logs.append(f"   ↳ 【{label} A表】已依比對鍵排序寫出 {len(runs)} 個暫存區段")
+            return spiller, runs, refunds, names
+
+        def spill_a_data(file_list, label, spill_dir):
+            # 外部排序合併：A 表逐檔、逐區塊串流讀取，正規化後寫入依比對鍵排序的 run 檔 (去重留到合併時逐批進行)
+            # 回傳 (RunSpiller, run 檔清單, 退款列, 來源檔名)
+            if date_range:
+                return spill_archived_a(label, spill_dir)
+            spiller = RunSpiller(spill_dir, f"{label}_A")
+            refunds = []
+            logs.append(f"📂 正在分段讀取【{label} A表】，共 {len(file_list)} 份檔案...")
+            for i, f in enumerate(file_list, 1):
+                n_rows = 0
+                stage("read")
+                for df_chunk, df_ref_chunk in iter_sheet_chunks(file_bytes(f), a_columns, header=2, required=col_id, split_when=col_refund, schema=a_schema, chunk_rows=BLOCK_ROWS):
+                    stage("normalize")
+                    n_rows += len(df_chunk)
+                    emit("read", f"{label} A表 {f.name}", rows=n_rows)
+                    if not df_ref_chunk.empty:
+                        refunds.append(df_ref_chunk)
+                    df_cln = clean_a(df_chunk)
+                    spiller.add(df_cln.assign(**{KEY_COL: sort_key(df_cln[col_id], df_cln['比對用車牌']), col_file: i - 1}))
+                    stage("read")
+                logs.append(f"   ↳ 成功讀取: {f.name} ({n_rows} 筆)")
+                emit("read", f"{label} A表 {f.name}", rows=n_rows, done=i, total=len(file_list))
+                count(f"{label} A表", n_rows)
+            runs = spiller.close()
+            logs.append(f"   ↳ 【{label} A表】已依比對鍵排序寫出 {len(runs)} 個暫存區段")
+            return spiller, runs, refunds, [f.name for f in file_list]
+
+        # 輸入總量超過 SORT_MERGE_THRESHOLD_MB 時改走外部排序合併：讀取、比對、寫出都分批進行，記憶體用量受 MERGE_MEMORY_MB 限制
+        sort_merge = use_sort_merge([*files_wash_a, *files_3in1_a, file_billing_upload])
+        if sort_merge:
+            logs.append(f"   💾 輸入檔較大，改用外部排序合併 (記憶體預算 {MERGE_MEMORY_BYTES // 1048576} MB，暫存檔寫入本機磁碟)")
+            df_a_wash = df_a_3in1 = df_a_refunds = None
+        else:
+            df_a_wash, df_ref_wash = prepare_a_data(files_wash_a, "洗車")
+            df_a_3in1, df_ref_3in1 = prepare_a_data(files_3in1_a, "三合一")
+        
+            df_a_refunds = pd.concat([df_ref_wash, df_ref_3in1], ignore_index=True)
+        if match_mode == "廠商新制 (手機後7碼-車牌)":
+             logs.append("   ⚠️ 已啟用新制：A表比對鍵轉換為【手機後7碼-車牌】格式")
+
+        stage("read")
+        logs.append(f"📂 正在讀取右側檔案 (請款明細/B表)...")
+        xls_b = CachedWorkbook(file_billing_upload)
+        available_sheets = xls_b.sheet_names
+        
+        sheet_name_billing = '請款' if '請款' in available_sheets else available_sheets[0]
+
+        wash_candidates = [s for s in available_sheets if ('明細' in s or 'detail' in s.lower()) and '三合一' not in s]
+        sheet_name_wash = wash_candidates[0] if wash_candidates else (available_sheets[1] if len(available_sheets)>1 else available_sheets[0])
+        
+        three_in_one_candidates = [s for s in available_sheets if '三合一' in s]
+        sheet_name_3in1 = three_in_one_candidates[0] if three_in_one_candidates else None
+        
+        logs.append(f"   🚀 B表鎖定工作表 ➔ 摘要: '{sheet_name_billing}' | 洗車: '{sheet_name_wash}' | 三合一: '{sheet_name_3in1}'")
+
+        df_daily, _ = read_excel_with_header(
+            xls_b, lambda vals: any('提供日期' in x for x in vals),
+            sheet_name=sheet_name_billing, default=2, usecols="A:E"
+        )
+        if len(df_daily.columns) >= 5:
+            val_count = pd.to_numeric(df_daily.iloc[:, 1], errors='coerce').fillna(0).sum()
+            val_billing = pd.to_numeric(df_daily.iloc[:, 2], errors='coerce').fillna(0).sum()
+            val_sms = pd.to_numeric(df_daily.iloc[:, 4], errors='coerce').fillna(0).sum()
+            val_total = val_billing + val_sms
+        else:
+            val_count, val_billing, val_sms, val_total = 0, 0, 0, 0
+
+        def clean_b(df_b_raw):
+            df_b_sub = df_b_raw.dropna(subset=[col_id]).copy()
+            df_b_sub[col_id] = normalize_order_id(df_b_sub[col_id])
+            df_b_sub = df_b_sub[~df_b_sub[col_id].str.contains('合計|Total|總計', case=False, na=False)]
+            
+            if col_phone not in df_b_sub.columns:
+                df_b_sub[col_phone] = ""
+            else:
+                df_b_sub[col_phone] = normalize_phone(df_b_sub[col_phone])
+
+            plate_b = df_b_sub[col_plate] if col_plate in df_b_sub.columns else pd.Series("", index=df_b_sub.index)
+            df_b_sub['比對用車牌'] = build_match_key(df_b_sub[col_phone], plate_b, match_mode, vendor_composite=True)
+            return df_b_sub
+
+        # 跨月對帳：各明細類別 ➔ {跨月狀態: 各批的跨月項目}，寫出時再加上前期未結
+        carry = {}
+        carry_columns = [col_id, '比對用車牌', '跨月狀態', 'A表月份', 'B表月份']
+
+        def carry_rows(df, a_period, b_period):
+            return pd.DataFrame({col_id: df[col_id].to_numpy(), '比對用車牌': df['比對用車牌'].to_numpy(), 'A表月份': a_period, 'B表月份': b_period}, columns=carry_columns)
+
+        def apply_state(df_a_sub, df_b_sub, label):
+            # 已去重的 A/B 兩側：暫存本期出現的鍵，並移除前期已兩邊對上的列 (不再比對) 與跨月對上的列，其餘照常比對
+            fp_a = key_fingerprint(df_a_sub[col_id], df_a_sub['比對用車牌'])
+            fp_b = key_fingerprint(df_b_sub[col_id], df_b_sub['比對用車牌'])
+            store.record(label, "a", fp_a, df_a_sub[col_id], df_a_sub['比對用車牌'])
+            store.record(label, "b", fp_b, df_b_sub[col_id], df_b_sub['比對用車牌'])
+            a_of_a, b_of_a = store.prior(label, fp_a)
+            a_of_b, b_of_b = store.prior(label, fp_b)
+
+            settled_a = pd.notna(a_of_a) & pd.notna(b_of_a)
+            settled_b = pd.notna(a_of_b) & pd.notna(b_of_b)
+            # 本期只出現在一邊、另一邊在前期出現過
+            carried_a = ~settled_a & pd.notna(b_of_a) & ~np.isin(fp_a, fp_b)
+            carried_b = ~settled_b & pd.notna(a_of_b) & ~np.isin(fp_b, fp_a)
+            for status, rows in (
+                ("前期已對帳：本期A表再次出現", carry_rows(df_a_sub[settled_a], a_of_a[settled_a], b_of_a[settled_a])),
+                ("前期已對帳：本期B表再次請款", carry_rows(df_b_sub[settled_b], a_of_b[settled_b], b_of_b[settled_b])),
+                ("跨月對上：B表前期已請款", carry_rows(df_a_sub[carried_a], target_month_str, b_of_a[carried_a])),
+                ("跨月對上：A表前期已出現", carry_rows(df_b_sub[carried_b], a_of_b[carried_b], target_month_str)),
+            ):
+                carry.setdefault(label, {}).setdefault(status, []).append(rows.assign(跨月狀態=status))
+            return df_a_sub[~(settled_a | carried_a)], df_b_sub[~(settled_b | carried_b)]
+
+        def state_sheet(label):
+            # 該明細類別的跨月對帳表：本期的跨月項目 + 前期未結 (前期只出現在一邊、本期仍未出現)
+            df_open = pd.DataFrame(store.open_items(label), columns=[col_id, '比對用車牌', 'A表月份', 'B表月份'])
+            df_open.insert(2, '跨月狀態', np.where(df_open['A表月份'].notna(), "前期未結：僅A表有", "前期未結：僅B表有"))
+            # 各狀態內依比對鍵排序 (記憶體版與外部排序合併的輸出順序一致)
+            parts = [pd.concat(frames).sort_values([col_id, '比對用車牌'], kind='stable') for frames in carry.pop(label).values()]
+            df_carry = pd.concat([df for df in parts if not df.empty] + [df_open[carry_columns]], ignore_index=True)
+            summary = "、".join(f"{k} {v} 筆" for k, v in df_carry['跨月狀態'].value_counts(sort=False).items()) or "無跨月項目"
+            logs.append(f"   🗓️ 【{label}】跨月對帳：{summary}")
+            count(f"{label} 跨月項目", len(df_carry))
+            return df_carry
+
+        def merge_frames(df_a_sub, df_b_sub, label):
+            # B 表先依組合鍵指紋去重 (A 表已去重)，再把兩側的比對鍵編成共用的整數代碼，合併在 int64 上進行
+            # 回傳 (對帳總表, 去重後的 B 表, B 表去除的重複列數)
+            dup_b = duplicate_keys(df_b_sub[col_id], df_b_sub['比對用車牌'])
+            df_b_sub = df_b_sub[~dup_b]
+            if store is not None:
+                df_a_sub, df_b_sub = apply_state(df_a_sub, df_b_sub, label)
+            (codes_a, codes_b), uniques = encode_keys([df_a_sub[col_id], df_a_sub['比對用車牌']], [df_b_sub[col_id], df_b_sub['比對用車牌']])
+            
+            base_cols_keep = [col_id, col_plate, col_phone]
+            cols_a = [c for c in base_cols_keep if c in df_a_sub.columns] + ['比對用車牌']
+            cols_b = [c for c in base_cols_keep if c in df_b_sub.columns] + ['比對用車牌']
+            
+            cols_a = list(dict.fromkeys(cols_a))
+            cols_b = list(dict.fromkeys(cols_b))
+            
+            df_total = merge_on_codes(
+                df_a_sub[cols_a], 
+                df_b_sub[cols_b], 
+                codes_a, codes_b, uniques,
+                on=[col_id, '比對用車牌'], 
+                how='outer', 
+                indicator=True, 
+                suffixes=('_A', '_B')
+            )
+            
+            df_total = df_total.drop(columns=['比對用車牌'], errors='ignore')
+            return df_total, df_b_sub, int(dup_b.sum())
+
+        def merge_datasets(df_a_sub, sheet_name_b, label):
+            if df_a_sub.empty or not sheet_name_b: 
+                return pd.DataFrame(), pd.DataFrame()
+            
+            stage("read")
+            if xls_b.is_large:
+                df_b_raw = xls_b.stream(b_columns, sheet_name=sheet_name_b, schema=b_schema, required=col_id, footer_pattern='合計|Total|總計')
+            else:
+                df_b_raw = xls_b.parse_columns(b_columns, sheet_name=sheet_name_b, schema=b_schema)
+            count(f"B表 {sheet_name_b}", len(df_b_raw))
+            emit("sheet", f"B表 {sheet_name_b}", rows=len(df_b_raw))
+            stage("normalize")
+            df_b_sub = clean_b(df_b_raw)
+                
+            stage("merge")
+            df_total, df_b_sub, n_dup_b = merge_frames(df_a_sub, df_b_sub, label)
+            log_duplicates(f"B表 {sheet_name_b}", [sheet_name_b], [n_dup_b])
+            count(f"{sheet_name_b} 對帳總表", len(df_total))
+            emit("merge", f"{sheet_name_b} 對帳總表", rows=len(df_total))
+            return df_total, df_b_sub
+
+        b_valid = {}
+
+        def sort_merge_batches(file_list, label, sheet_name_b):
+            """
+            外部排序合併版的 prepare_a_data + merge_datasets：逐批產出對帳總表，
+            每一批包含若干組完整的比對鍵，批內處理方式 (A/B 去重、outer merge) 與記憶體版相同
+            """
+            if not (file_list or date_range) or not sheet_name_b:
+                return
+            with spill_directory() as spill_dir:
+                spill_a, runs_a, refunds, names = spill_a_data(file_list, label, spill_dir)
+                df_a_refund_parts.extend(refunds)
+                if not spill_a.rows:
+                    return
+
+                stage("read")
+                spill_b = RunSpiller(spill_dir, f"{label}_B")
+                n_raw = 0
+                for df_chunk, _ in iter_sheet_chunks(xls_b.data, b_columns, sheet_name=sheet_name_b, schema=b_schema, required=col_id, footer_pattern='合計|Total|總計', chunk_rows=BLOCK_ROWS):
+                    stage("normalize")
+                    n_raw += len(df_chunk)
+                    emit("sheet", f"B表 {sheet_name_b}", rows=n_raw)
+                    df_b_sub = clean_b(df_chunk)
+                    spill_b.add(df_b_sub.assign(**{KEY_COL: sort_key(df_b_sub[col_id], df_b_sub['比對用車牌'])}))
+                    stage("read")
+                count(f"B表 {sheet_name_b}", n_raw)
+                runs_b = spill_b.close()
+
+                n_a = n_b = n_total = n_done = n_dup_b = 0
+                dup_a = np.zeros(len(names), dtype=np.int64)
+                for df_a_part, df_b_part in iter_key_batches(runs_a, runs_b, columns=[spill_a.columns, spill_b.columns or b_columns + ['比對用車牌', KEY_COL]]):
+                    stage("merge")
+                    n_done += len(df_a_part)
+                    df_a_part, dup_part = dedup_a(df_a_part.drop(columns=[KEY_COL]), df_a_part[col_file], len(names))
+                    df_total, df_b_part, n_dup_part = merge_frames(df_a_part.drop(columns=[col_file]), df_b_part.drop(columns=[KEY_COL]), label)
+                    dup_a, n_dup_b = dup_a + dup_part, n_dup_b + n_dup_part
+                    n_a, n_b, n_total = n_a + len(df_a_part), n_b + len(df_b_part), n_total + len(df_total)
+                    emit("merge", f"{sheet_name_b} 對帳總表", rows=n_total, done=n_done, total=spill_a.rows)
+                    yield df_total
+
+            log_duplicates(f"{label} A表", names, dup_a)
+            logs.append(f"   ↳ 【{label} A表】合併去重後，共 {n_a} 筆有效資料")
+            count(f"{label} A表有效", n_a)
+            log_duplicates(f"B表 {sheet_name_b}", [sheet_name_b], [n_dup_b])
+            count(f"{sheet_name_b} 對帳總表", n_total)
+            b_valid[label] = n_b
+
+        if sort_merge:
+            df_a_refund_parts = []
+            results_wash = sort_merge_batches(files_wash_a, "洗車", sheet_name_wash)
+            results_3in1 = sort_merge_batches(files_3in1_a, "三合一", sheet_name_3in1)
+        else:
+            df_total_wash, df_b_wash_clean = merge_datasets(df_a_wash, sheet_name_wash, "洗車")
+            df_total_3in1, df_b_3in1_clean = merge_datasets(df_a_3in1, sheet_name_3in1, "三合一")
+            results_wash, results_3in1 = [df_total_wash], [df_total_3in1]
+            b_valid = {"洗車": len(df_b_wash_clean), "三合一": len(df_b_3in1_clean)}
+
+            logs.append(f"   ↳ 📊 B表有效筆數統計：洗金寶 {b_valid['洗車']} 筆，三合一 {b_valid['三合一']} 筆")
+            logs.append(f"✅ 雙路對帳完成！輸出報表已限定必填欄位。")
+
+        stage("write")
+        # 僅差異的輸出格式只寫「僅A表有 / 僅B表有」；非 xlsx 格式交給 TableExport (不套格式)
+        full = not diff_only(export_format)
+        export = None if is_xlsx(export_format) else TableExport(export_format)
+        top_headers = ['統計月份', '轉檔筆數', '轉檔請款金額', '簡訊請款金額', '合計金額']
+        top_values = [target_month_str, val_count, val_billing, val_sms, val_total]
+        if export is not None:
+            writer_ctx = nullcontext()
+        elif sort_merge:
+            # 總列數要合併完才知道，直接以 constant_memory 逐列寫出
+            writer_ctx = excel_writer(output, constant_memory=True)
+        else:
+            writer_ctx = excel_writer(output, len(df_total_wash) + len(df_total_3in1) + len(df_a_refunds))
+        with writer_ctx as writer:
+            if export is None:
+                wb = writer.book
+                
+                fmt_header = wb.add_format({'bold': True, 'bg_color': '#EFEFEF', 'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 12})
+                fmt_content = wb.add_format({'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 11})
+                fmt_currency = wb.add_format({'num_format': '#,##0', 'border': 1, 'align': 'right', 'valign': 'vcenter', 'font_size': 11})
+                fmt_blue = wb.add_format({'bg_color': '#DDEBF7', 'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 11})
+                fmt_pink = wb.add_format({'bg_color': '#FCE4D6', 'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_size': 11})
+
+                if full:
+                    ws1 = wb.add_worksheet('請款')
+                    ws1.set_row(0, 30)
+                    ws1.set_row(1, 25)
+                    ws1.set_column('A:E', 25) 
+                    ws1.write_row(0, 0, top_headers, fmt_header)
+                    ws1.write(1, 0, top_values[0], fmt_content)
+                    ws1.write_row(1, 1, top_values[1:], fmt_currency)
+                    ws1.write_row(3, 0, df_daily.columns.tolist(), fmt_header)
+                    write_rows(ws1, 4, frame_rows(df_daily), [fmt_content] * len(df_daily))
+                    emit("write", "請款", rows=len(df_daily))
+            else:
+                fmt_header = None
+                if full:
+                    export.add('請款', pd.DataFrame([top_values], columns=top_headers))
+                    export.add('請款明細', df_daily)
+
+            def open_sheet(name, columns, **style):
+                if export is not None:
+                    return export.sheet(name, columns)
+                return FrameSheet(writer, name, columns, **style)
+
+            def write_result_sheets(batches, prefix_name):
+                # batches：依比對鍵排序的對帳總表區塊 (記憶體版只有一塊)；三張表同步逐批往下寫
+                sheets = None
+                for df_result in batches:
+                    if df_result.empty: continue
+                    stage("write")
+                    if sheets is None:
+                        columns = df_result.columns.tolist()
+                        detail_columns = [c for c in columns if c != '_merge']
+                        sheets = (
+                            open_sheet(f'{prefix_name}_對帳總表', columns, header_fmt=fmt_header, width=22, header_height=22) if full else None,
+                            open_sheet(f'{prefix_name}_僅A表有', detail_columns),
+                            open_sheet(f'{prefix_name}_僅B表有', detail_columns),
+                        )
+                    ws_total, ws_left, ws_right = sheets
+
+                    if ws_total is not None:
+                        # 依 _merge 狀態整列套色：僅A表有=藍、僅B表有=粉紅
+                        formats = row_formats(df_result['_merge'], {'left_only': fmt_blue, 'right_only': fmt_pink}, default=fmt_content) if export is None else None
+                        ws_total.append(df_result, formats, height=18)
+                    ws_left.append(df_result[df_result['_merge'] == 'left_only'].drop(columns=['_merge']))
+                    ws_right.append(df_result[df_result['_merge'] == 'right_only'].drop(columns=['_merge']))
+
+            for batches, prefix_name in ((results_wash, "洗車"), (results_3in1, "三合一")):
+                write_result_sheets(batches, prefix_name)
+                # 跨月對帳表要等該類別全部比對完 (外部排序合併時為最後一批之後) 才能產生
+                if prefix_name in carry:
+                    df_carry = state_sheet(prefix_name)
+                    open_sheet(f'{prefix_name}_跨月對帳', carry_columns).append(df_carry)
+
+            if sort_merge:
+                df_a_refunds = pd.concat(df_a_refund_parts, ignore_index=True) if df_a_refund_parts else pd.DataFrame()
+                logs.append(f"   ↳ 📊 B表有效筆數統計：洗金寶 {b_valid.get('洗車', 0)} 筆，三合一 {b_valid.get('三合一', 0)} 筆")
+                logs.append(f"✅ 雙路對帳完成！輸出報表已限定必填欄位。")
+            
+            if full and not df_a_refunds.empty:
+                if export is None:
+                    write_frame(writer, df_a_refunds, 'A表退款排除名單')
+                else:
+                    export.add('A表退款排除名單', df_a_refunds)
+
+        if export is not None:
+            export.save(output)
+            output_filename = export.filename(output_filename)
+        if store is not None:
+            store.commit()
+        result = output.finish()
+        add_bytes(written=len(result))
+        return result, logs, output_filename
+
+    except Exception as e:
+        import traceback
+        return None, [f"❌ 錯誤: {str(e)}", traceback.format_exc()], None
+    finally:
+        output.discard()
+        if store is not None:
+            store.close()
+
+# ==========================================
+# 📺 功能 B：LiTV 對帳邏輯
+# ==========================================
+def process_litv(file_a_upload, file_b_upload, export_format=DEFAULT_EXPORT_FORMAT):
+    output_buffer = ResultBuffer()
+    logs = ProgressLog()
+    output_filename = "LiTV_CMX確認.xlsx"
+
+    try:
+        check_format(export_format)
+        stage("read")
+        xl_a = CachedWorkbook(file_a_upload)
+        xl_b = CachedWorkbook(file_b_upload)
+        file_a_target, file_b_target = file_a_upload, file_b_upload
+
+        if 'ACG對帳明細' in xl_a.sheet_names and 'ACG對帳明細' not in xl_b.sheet_names:
+            logs.append("💡 偵測到檔案順序相反，已自動交換 A/B 表。")
+            file_a_target, file_b_target = file_b_upload, file_a_upload
+            xl_a, xl_b = xl_b, xl_a
+        elif 'ACG對帳明細' in xl_b.sheet_names:
+            logs.append("✅ 檔案順序正確。")
+        else:
+             return None, [f"❌ 錯誤：找不到「ACG對帳明細」。"], None, None, None
+        
+        base_name = os.path.splitext(file_b_target.name)[0]
+        output_filename = f"{base_name}_CMX確認.xlsx"
+        
+        file_a_target.seek(0)
+        file_b_target.seek(0)
+
+        # xlsx 輸出是在 B 表原檔上標示差異 (xlsx-diff 同 xlsx)；其他格式只輸出比對結果
+        if is_xlsx(export_format):
+            logs.append("正在載入 B 表...")
+            patcher = XlsxPatcher(xl_b.data)
+
+        logs.append("正在讀取 A 表 (header=2)...")
+        df_a = xl_a.parse_columns(['訂單編號', '金額', '退款時間', '手機號碼', '方案(SKU)'], header=2, schema={'金額': NUMERIC, '退款時間': DATETIME, '手機號碼': ID})
+        df_a.columns = df_a.columns.str.strip()
+        
+        if '金額' not in df_a.columns: return None, [f"❌ 錯誤：A 表讀不到「金額」欄位。"], None, None, None
+
+        count("A表", len(df_a))
+        emit("read", f"A表 {file_a_target.name}", rows=len(df_a))
+        stage("normalize")
+        df_a['金額'] = pd.to_numeric(df_a['金額'], errors='coerce').fillna(0)
+        df_a_filtered = df_a[(df_a['金額'] > 0) & (df_a['退款時間'].isna()) & (df_a['手機號碼'].notna())].copy()
+
+        df_a_filtered['手機全碼'] = normalize_litv_phone(df_a_filtered['手機號碼'])
+        df_a_filtered['手機隱碼'] = mask_phone(df_a_filtered['手機全碼'])
+        a_pairs = (df_a_filtered['手機隱碼'], normalize_text(df_a_filtered['方案(SKU)']))
+
+        stage("read")
+        logs.append("正在讀取 ACG 對帳明細...")
+        df_b_acg_full = xl_b.parse_columns(['編號', '手機/虛擬帳號', '廠商對帳key1'], sheet_name='ACG對帳明細', schema={'手機/虛擬帳號': ID, '廠商對帳key1': ID})
+        df_b_acg_full.columns = df_b_acg_full.columns.str.strip()
+
+        count("ACG對帳明細", len(df_b_acg_full))
+        emit("sheet", "ACG對帳明細", rows=len(df_b_acg_full))
+        stage("normalize")
+        stop_idx = find_stop_index(df_b_acg_full['編號'])
+        df_b_valid = df_b_acg_full.iloc[:stop_idx].copy() if stop_idx is not None else df_b_acg_full.copy()
+        
+        df_b_valid = df_b_valid.dropna(subset=['手機/虛擬帳號', '廠商對帳key1']).copy()
+        df_b_valid['手機/虛擬帳號'] = normalize_text(df_b_valid['手機/虛擬帳號'])
+        df_b_valid['廠商對帳key1'] = normalize_text(df_b_valid['廠商對帳key1'])
+        b_pairs = (df_b_valid['手機/虛擬帳號'], df_b_valid['廠商對帳key1'])
+
+        count("A表有效", len(df_a_filtered))
+        count("ACG 計費", len(df_b_valid))
+        stage("merge")
+        sheet1, df_diff_a = build_cmx_sheet(df_a_filtered, b_pairs)
+        df_diff_b = df_b_valid.loc[b_not_in_a(df_b_valid['手機/虛擬帳號'], df_b_valid['廠商對帳key1'], a_pairs), ['手機/虛擬帳號', '廠商對帳key1']]
+        diff_a_not_b = df_diff_a.to_dict('records')
+        diff_b_not_a = df_diff_b.to_dict('records')
+
+        count("A有B無", len(diff_a_not_b))
+        count("B有A無", len(diff_b_not_a))
+        emit("merge", "A有B無 / B有A無", rows=len(diff_a_not_b) + len(diff_b_not_a))
+        stage("write")
+        if not is_xlsx(export_format):
+            export = TableExport(export_format)
+            if not diff_only(export_format):
+                export.add("CMX對帳明細", sheet1[SHEET1_COLUMNS])
+            export.add("A有B無", df_diff_a)
+            export.add("B有A無", df_diff_b)
+            export.save(output_buffer)
+            result = output_buffer.finish()
+            add_bytes(written=len(result))
+            return result, logs, diff_a_not_b, diff_b_not_a, export.filename(output_filename)
+
+        logs.append("正在寫入 Excel...")
+        font_18, yellow_fill = font_xml(18), solid_fill_xml('FFFF00')
+
+        patcher.remove_sheet("CMX對帳明細")
+        fmt_normal = patcher.derived_xf(0, font_xml=font_18)
+        fmt_diff = patcher.derived_xf(0, font_xml=font_18, fill_xml=yellow_fill)
+        new_rows = [(SHEET1_COLUMNS, None)]
+        new_rows += list(zip(sheet1[SHEET1_COLUMNS].values.tolist(), np.where(sheet1['is_diff'], fmt_diff, fmt_normal).tolist()))
+        patcher.insert_sheet_first("CMX對帳明細", new_rows)
+        emit("write", "CMX對帳明細", rows=len(sheet1))
+
+        if '手機/虛擬帳號' in df_b_acg_full.columns and '廠商對帳key1' in df_b_acg_full.columns:
+            # DataFrame 第 i 列對應 ACG對帳明細 的 Excel 第 i+2 列
+            diff_mask = b_not_in_a(normalize_text(df_b_acg_full['手機/虛擬帳號']), normalize_text(df_b_acg_full['廠商對帳key1']), a_pairs)
+            diff_rows = set((np.flatnonzero(diff_mask) + 2).tolist())
+            max_row = (stop_idx + 1) if stop_idx is not None else None
+            patcher.restyle_rows(
+                'ACG對帳明細', 2, max_row,
+                lambda r, s: patcher.derived_xf(s, font_xml=font_18, fill_xml=yellow_fill if r in diff_rows else None)
+            )
+            emit("write", "ACG對帳明細 (標示差異)", rows=len(diff_rows))
+        
+        patcher.save(output_buffer)
+        result = output_buffer.finish()
+        add_bytes(written=len(result))
+        return result, logs, diff_a_not_b, diff_b_not_a, output_filename
+
+    except Exception as e:
+        return None, [f"❌ 程式執行錯誤: {str(e)}"], None, None, None
+    finally:
+        output_buffer.discard()
+
+# ==========================================
+# 💰 功能 C：和泰點數對帳邏輯 (自動正負相抵抵銷版)
+# ==========================================
+def process_points(file_a_upload, file_b_upload, export_format=DEFAULT_EXPORT_FORMAT):
+    output_buffer = ResultBuffer()
+    logs = ProgressLog()
+    output_filename = "和泰點數對帳差異結果.xlsx"
+    
+    try:
+        check_format(export_format)
+        file_a_upload.seek(0)
+        file_b_upload.seek(0)
+        # 僅差異的輸出格式不寫「完整比對總表」
+        full = not diff_only(export_format)
+        
+        # 輸入總量超過 SORT_MERGE_THRESHOLD_MB 時改走外部排序合併 (見 sortmerge.py)
+        sort_merge = use_sort_merge([file_a_upload, file_b_upload])
+        a_schema = {'訂單編號': ID, '點數': NUMERIC, '總金額': NUMERIC, '退款時間': DATETIME, '訂單建立時間': DATETIME}
+        b_schema = {'兌點數': NUMERIC, '特約商交易序號': ID}
+        find_a_header = lambda vals: any('訂單' in x for x in vals) and (any('金額' in x for x in vals) or any('點數' in x for x in vals))
+
+        stage("read")
+        logs.append("📂 正在讀取【CMX 訂單報表 (附件一)】...")
+        
+        book_a = CachedWorkbook(file_a_upload)
+        if sort_merge:
+            logs.append(f"   💾 輸入檔較大，改用外部排序合併 (記憶體預算 {MERGE_MEMORY_BYTES // 1048576} MB，暫存檔寫入本機磁碟)")
+            # 先只讀前 20 列找出標題列與欄位，資料列稍後分段串流
+            df_head = read_head_rows(book_a.data)
+            header_idx = find_header_row(df_head, find_a_header)
+            df_a = promote_header(df_head, header_idx, a_schema)
+        else:
+            df_a, header_idx = read_excel_with_header(book_a, find_a_header, schema=a_schema)
+        df_a.columns = df_a.columns.astype(str).str.replace(r'\s+', '', regex=True)
+        
+        col_id = next((c for c in df_a.columns if '訂單編號' in c), None)
+        col_pts = next((c for c in df_a.columns if '和泰點數' in c), None)
+        if not col_pts:
+            col_pts = next((c for c in df_a.columns if '點數' in c), None)
+        col_refund = next((c for c in df_a.columns if '退款時間' in c), None)
+        
+        if not col_pts:
+            sample_cols = ", ".join(df_a.columns.tolist()[:5])
+            logs.append(f"❌ 錯誤：無法在附件一中找到包含「點數」的欄位。(抓到的欄位：{sample_cols}...)\n💡 防呆提示：請確認您是否不小心將「洗車」或「LiTV」的報表上傳到點數對帳區了？")
+            return None, logs, 0, None
+            
+        if not col_id:
+            logs.append("❌ 錯誤：無法在附件一中找到包含「訂單編號」的欄位。請確認報表格式！")
+            return None, logs, 0, None
+
+        rename_dict = {col_id: '訂單編號', col_pts: '原始_和泰點數'}
+        if col_refund:
+            rename_dict[col_refund] = '退款時間'
+        df_a.rename(columns=rename_dict, inplace=True)
+            
+        logs.append(f"   ↳ 成功鎖定 A 表標題列於第 {header_idx+1} 列。")
+
+        cols_to_keep = ['訂單編號', '原始_和泰點數', '有效和泰點數']
+        if '訂單建立時間' in df_a.columns: cols_to_keep.append('訂單建立時間')
+        if '總金額' in df_a.columns: cols_to_keep.append('總金額')
+        if '退款時間' in df_a.columns: cols_to_keep.append('退款時間')
+
+        final_cols = ['比對單號(訂單編號)'] + [c for c in ('訂單建立時間', '總金額', '退款時間') if c in cols_to_keep]
+        final_cols.extend(['原始_和泰點數', '有效和泰點數', '附件二_總兌點數', '差異(有效點數減附件二)'])
+        # 重新命名以便閱讀
+        rename_map = {'原始_和泰點數': '附件一_原始和泰點數', '總金額': '附件一_總金額', '有效和泰點數': '附件一_有效和泰點數'}
+
+        def prepare_a(df_a):
+            # 附件一：有退款時間就當作 0，否則保留原點數 (逐列運算，可分批處理)
+            df_a['原始_和泰點數'] = pd.to_numeric(df_a['原始_和泰點數'], errors='coerce').fillna(0)
+            if '退款時間' in df_a.columns:
+                df_a['有效和泰點數'] = np.where(df_a['退款時間'].notna(), 0, df_a['原始_和泰點數'])
+            else:
+                df_a['有效和泰點數'] = df_a['原始_和泰點數']
+            df_a_subset = df_a[cols_to_keep].copy()
+            # 訂單編號讀取時已是字串；仍去除文字儲存格中的 .0 (例：系統匯出的 "123.0")
+            df_a_subset['訂單編號'] = normalize_order_id(df_a_subset['訂單編號'])
+            return df_a_subset
+
+        def merge_points(df_a_subset, df_b_grouped):
+            # 回傳 (完整比對總表, 差異清單)，兩者皆已整理為輸出欄位
+            (codes_a, codes_b), _ = encode_keys([df_a_subset['訂單編號']], [df_b_grouped['特約商交易序號']])
+            merged = merge_on_codes(df_a_subset, df_b_grouped, codes_a, codes_b, how='outer')
+            merged['比對單號(訂單編號)'] = merged['訂單編號'].combine_first(merged['特約商交易序號'])
+            
+            # 移除未配對的空值
+            merged['比對單號(訂單編號)'] = merged['比對單號(訂單編號)'].astype(str).str.replace('nan', '', case=False)
+            merged = merged[merged['比對單號(訂單編號)'] != ""]
+
+            merged['有效和泰點數'] = merged['有效和泰點數'].fillna(0)
+            merged['附件二_總兌點數'] = merged['附件二_總兌點數'].fillna(0)
+            
+            # 計算最終差異：有效點數 - 附件二相加後的總點數
+            merged['差異(有效點數減附件二)'] = merged['有效和泰點數'] - merged['附件二_總兌點數']
+            
+            # 整理輸出格式 (只抓差異不為 0 的)
+            discrepancies = merged[merged['差異(有效點數減附件二)'] != 0][final_cols].rename(columns=rename_map)
+            merged_sorted = merged[final_cols].rename(columns=rename_map)
+            return merged_sorted, discrepancies
+
+        def sum_b(ids, points):
+            # 這裡【不刪除】負數或「點數交易取消」，直接讓它們加總時正負相加抵銷
+            # 交易序號先正規化再加總，避免同一筆交易因 123.0 / "123" 格式不同被拆成兩組
+            df_b_grouped, df_collapsed = sum_points_by_id(ids, points)
+            df_b_grouped.columns = ['特約商交易序號', '附件二_總兌點數']
+            return df_b_grouped, df_collapsed
+
+        def log_collapsed(df_collapsed):
+            if not df_collapsed.empty:
+                logs.append(f"   ⚠️ 附件二有 {len(df_collapsed)} 個交易序號以不同格式出現，已合併加總：")
+                logs.extend(f"      ↳ {row['交易序號']} ← {row['原始寫法']}" for _, row in df_collapsed.head(10).iterrows())
+
+        def b_columns(df_b):
+            df_b.columns = df_b.columns.astype(str).str.replace(r'\s+', '', regex=True)
+            return next((c for c in df_b.columns if '兌點數' in c), None), next((c for c in df_b.columns if '特約商交易序號' in c), None)
+
+        missing_b = "❌ 錯誤：附件二缺乏必要欄位（需包含「兌點數」及「特約商交易序號」）。"
+
+        def write_sheet_formats(workbook, sheets):
+            # sheets：[(工作表, 欄位清單, 資料列數)]；差異欄 (最後一欄) 不為 0 時以紅字標示
+            fmt_red_text = workbook.add_format({'font_color': '#C00000', 'bold': True})
+            for sheet, columns, n_rows in sheets:
+                diff_col_idx = len(columns) - 1
+                sheet.conditional_format(1, diff_col_idx, n_rows, diff_col_idx, 
+                                         {'type': 'cell', 'criteria': '!=', 'value': 0, 'format': fmt_red_text})
+
+        if sort_merge:
+            # 外部排序合併：附件一 / 附件二分段讀取並依訂單編號排序寫出 run 檔，再逐批加總、比對並直接寫入活頁簿
+            with spill_directory() as spill_dir:
+                spill_a = RunSpiller(spill_dir, "A")
+                a_keywords = [c for c in (col_id, col_pts, col_refund, '訂單建立時間', '總金額') if c]
+                n_a = 0
+                for df_chunk, _ in iter_sheet_chunks(book_a.data, a_keywords, header=header_idx, schema=a_schema, chunk_rows=BLOCK_ROWS):
+                    stage("normalize")
+                    n_a += len(df_chunk)
+                    emit("read", f"附件一 {file_a_upload.name}", rows=n_a)
+                    df_chunk.columns = df_chunk.columns.astype(str).str.replace(r'\s+', '', regex=True)
+                    df_a_part = prepare_a(df_chunk.rename(columns=rename_dict))
+                    spill_a.add(df_a_part.assign(**{KEY_COL: sort_key(df_a_part['訂單編號'])}))
+                    stage("read")
+                count("附件一", n_a)
+                emit("read", f"附件一 {file_a_upload.name}", rows=n_a, done=1, total=2)
+                runs_a = spill_a.close()
+                logs.append("🧹 計算附件一有效點數：若有退款時間，則「有效和泰點數」視為 0...")
+
+                logs.append("📂 正在讀取【特約商點數歷程 (附件二)】...")
+                spill_b = RunSpiller(spill_dir, "B")
+                n_b = 0
+                for df_chunk, _ in iter_sheet_chunks(file_bytes(file_b_upload), ['兌點數', '特約商交易序號'], schema=b_schema, chunk_rows=BLOCK_ROWS):
+                    stage("normalize")
+                    col_b_pts, col_b_id = b_columns(df_chunk)
+                    if not col_b_pts or not col_b_id:
+                        logs.append(missing_b)
+                        return None, logs, 0, None
+                    n_b += len(df_chunk)
+                    emit("read", f"附件二 {file_b_upload.name}", rows=n_b)
+                    df_b_part = pd.DataFrame({'交易序號': df_chunk[col_b_id], '點數': pd.to_numeric(df_chunk[col_b_pts], errors='coerce').fillna(0)})
+                    df_b_part = df_b_part[df_b_part['交易序號'].notna()]
+                    spill_b.add(df_b_part.assign(**{KEY_COL: sort_key(normalize_order_id(df_b_part['交易序號']))}))
+                    stage("read")
+                count("附件二", n_b)
+                emit("read", f"附件二 {file_b_upload.name}", rows=n_b, done=2, total=2)
+                runs_b = spill_b.close()
+                logs.append("🧹 處理附件二：保留所有正負點數紀錄，加總同一訂單使其自然相抵...")
+                logs.append(f"   ↳ 附件一 {n_a} 筆、附件二 {n_b} 筆，已依訂單編號排序寫出 {len(runs_a) + len(runs_b)} 個暫存區段")
+
+                logs.append("🔄 正在進行比對 (Outer Join)...")
+                collapsed_parts = []
+                out_cols = [rename_map.get(c, c) for c in final_cols]
+                export = None if is_xlsx(export_format) else TableExport(export_format)
+                with (excel_writer(output_buffer, constant_memory=True) if export is None else nullcontext()) as writer:
+                    if export is None:
+                        workbook = writer.book
+                        fmt_header = workbook.add_format({'bold': True, 'bg_color': '#333F4F', 'font_color': 'white', 'border': 1, 'align': 'center'})
+                        ws_diff = FrameSheet(writer, '點數比對差異清單', out_cols, fmt_header, width=18)
+                        ws_all = FrameSheet(writer, '完整比對總表', out_cols, fmt_header, width=18) if full else None
+                    else:
+                        ws_diff = export.sheet('點數比對差異清單', out_cols)
+                        ws_all = export.sheet('完整比對總表', out_cols) if full else None
+                    batches = iter_key_batches(runs_a, runs_b, columns=[spill_a.columns or cols_to_keep + [KEY_COL], spill_b.columns or ['交易序號', '點數', KEY_COL]])
+                    n_done = n_all = 0
+                    for df_a_part, df_b_part in batches:
+                        stage("merge")
+                        n_done += len(df_a_part)
+                        df_b_grouped, df_collapsed = sum_b(df_b_part['交易序號'], df_b_part['點數'])
+                        collapsed_parts.append(df_collapsed)
+                        merged_part, diff_part = merge_points(df_a_part.drop(columns=[KEY_COL]), df_b_grouped)
+                        n_all += len(merged_part)
+                        emit("merge", "完整比對總表", rows=n_all, done=n_done, total=n_a)
+                        stage("write")
+                        ws_diff.append(diff_part)
+                        if ws_all is not None:
+                            ws_all.append(merged_part)
+                    if export is None:
+                        write_sheet_formats(workbook, [(ws.ws, out_cols, ws.rows) for ws in (ws_diff, ws_all) if ws is not None])
+
+            log_collapsed(pd.concat(collapsed_parts, ignore_index=True) if collapsed_parts else pd.DataFrame())
+            diff_count = ws_diff.rows
+            count("完整比對總表", n_all)
+            count("差異", diff_count)
+            logs.append(f"✅ 比對完成！共發現 {diff_count} 筆點數出入。")
+            if export is not None:
+                export.save(output_buffer)
+                output_filename = export.filename(output_filename)
+            result = output_buffer.finish()
+            add_bytes(written=len(result))
+            return result, logs, diff_count, output_filename
+
+        logs.append("📂 正在讀取【特約商點數歷程 (附件二)】...")
+        df_b = CachedWorkbook(file_b_upload).parse_columns(['兌點數', '特約商交易序號'], schema=b_schema)
+        col_b_pts, col_b_id = b_columns(df_b)
+        
+        count("附件一", len(df_a))
+        count("附件二", len(df_b))
+        emit("read", f"附件一 {file_a_upload.name}", rows=len(df_a), done=1, total=2)
+        emit("read", f"附件二 {file_b_upload.name}", rows=len(df_b), done=2, total=2)
+        stage("normalize")
+        # --- 處理附件一 ---
+        logs.append("🧹 計算附件一有效點數：若有退款時間，則「有效和泰點數」視為 0...")
+        df_a_subset = prepare_a(df_a)
+            
+        # --- 處理附件二 ---
+        logs.append("🧹 處理附件二：保留所有正負點數紀錄，加總同一訂單使其自然相抵...")
+        
+        if not col_b_pts or not col_b_id:
+            logs.append(missing_b)
+            return None, logs, 0, None
+
+        df_b[col_b_pts] = pd.to_numeric(df_b[col_b_pts], errors='coerce').fillna(0)
+        
+        stage("merge")
+        df_b_grouped, df_collapsed = sum_b(df_b[col_b_id], df_b[col_b_pts])
+        log_collapsed(df_collapsed)
+        
+        # --- 比的外資料 ---
+        logs.append("🔄 正在進行比對 (Outer Join)...")
+        merged_sorted, discrepancies = merge_points(df_a_subset, df_b_grouped)
+        
+        diff_count = len(discrepancies)
+        count("完整比對總表", len(merged_sorted))
+        count("差異", diff_count)
+        emit("merge", "完整比對總表", rows=len(merged_sorted))
+        logs.append(f"✅ 比對完成！共發現 {diff_count} 筆點數出入。")
+        
+        out_sheets = [('點數比對差異清單', discrepancies)]
+        if full:
+            out_sheets.append(('完整比對總表', merged_sorted))
+
+        # --- 產生 Excel / CSV / Parquet ---
+        stage("write")
+        if not is_xlsx(export_format):
+            export = TableExport(export_format)
+            for name, df_out in out_sheets:
+                export.add(name, df_out)
+            export.save(output_buffer)
+            result, output_filename = output_buffer.finish(), export.filename(output_filename)
+            add_bytes(written=len(result))
+            return result, logs, diff_count, output_filename
+
+        with pd.ExcelWriter(output_buffer, engine='xlsxwriter') as writer:
+            for name, df_out in out_sheets:
+                df_out.to_excel(writer, sheet_name=name, index=False)
+            
+            workbook = writer.book
+            fmt_header = workbook.add_format({'bold': True, 'bg_color': '#333F4F', 'font_color': 'white', 'border': 1, 'align': 'center'})
+            
+            for name, df_ref in out_sheets:
+                sheet = writer.sheets[name]
+                sheet.set_column(0, len(df_ref.columns)-1, 18)
+                for col_num, value in enumerate(df_ref.columns.values):
+                    sheet.write(0, col_num, value, fmt_header)
+                emit("write", name, rows=len(df_ref))
+            write_sheet_formats(workbook, [(writer.sheets[name], df_ref.columns, len(df_ref)) for name, df_ref in out_sheets])
+                
+        result = output_buffer.finish()
+        add_bytes(written=len(result))
+        return result, logs, diff_count, output_filename
+    
+    except Exception as e:
+        import traceback
+        return None, [f"❌ 程式執行錯誤: {str(e)}", traceback.format_exc()], 0, None
+    finally:
+        # 中途出錯或提早結束時刪除未完成的輸出檔
+        output_buffer.discard()
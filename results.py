@@ -0,0 +1,112 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+
+# ==========================================
+# 結果檔暫存區：對帳結果直接寫入本機資料夾 (RESULT_DIR)，不再以 BytesIO.getvalue() 複製整份檔案，
+# 背景工作只把路徑 (ResultFile) 交回主行程，下載時才從磁碟讀取；超過 RESULT_TTL_HOURS 的結果檔自動清除
+#
+#   RESULT_DIR：結果檔資料夾 (預設為系統暫存資料夾下的 reconcile_results)
+#   RESULT_TTL_HOURS：結果檔保留時數 (預設 24)
+# ==========================================
+
+RESULT_DIR = os.environ.get("RESULT_DIR") or os.path.join(tempfile.gettempdir(), "reconcile_results")
+RESULT_TTL_SECONDS = float(os.environ.get("RESULT_TTL_HOURS", "24")) * 3600
+
+
+class ResultFile:
+    """
+    結果資料夾中的一個輸出檔：只記錄路徑與大小，可序列化交回主行程 (不傳送檔案內容)
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return True
+
+    def __bytes__(self):
+        return self.read()
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def read(self):
+        with self.open() as fh:
+            return fh.read()
+
+    def move_to(self, dest):
+        """
+        移到指定路徑 (命令列輸出)；同一檔案系統時只是改名，不複製內容
+        """
+        shutil.move(self.path, dest)
+        # mkstemp 建立的檔案只有擁有者可讀寫，移出後改回一般檔案的權限
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(dest, 0o666 & ~umask)
+        self.path = dest
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ResultBuffer(io.BufferedRandom):
+    """
+    取代 io.BytesIO 的輸出檔：內容直接寫入結果資料夾中的新檔案
+    寫完呼叫 finish() 取得 ResultFile；未 finish() 就 discard() (例：流程中途出錯) 會刪除檔案
+    """
+
+    def __init__(self, directory=None):
+        directory = directory or RESULT_DIR
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="result_", dir=directory)
+        super().__init__(io.FileIO(fd, "w+b"))
+        self._finished = False
+
+    def finish(self):
+        self.close()
+        self._finished = True
+        return ResultFile(self.path, os.path.getsize(self.path))
+
+    def discard(self):
+        if self._finished:
+            return
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def cleanup_results(max_age=None, directory=None):
+    """
+    刪除超過保留時間的結果檔 (依最後修改時間)，回傳刪除的檔案數
+    """
+    directory = directory or RESULT_DIR
+    cutoff = time.time() - (RESULT_TTL_SECONDS if max_age is None else max_age)
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.startswith("result_") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
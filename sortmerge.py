@@ -0,0 +1,181 @@
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from readers import file_size
+
+# ==========================================
+# 外部排序合併 (out-of-core sort-merge)：輸入超過記憶體時的對帳引擎
+# 1. 各側資料分批正規化後加上排序鍵，累積到記憶體預算就依鍵排序寫出一個暫存 run 檔
+# 2. 合併階段每個 run 只保留一個區塊在記憶體，依鍵由小到大切出「同一組鍵一定落在同一批」的 A/B 批次
+# 3. 每一批交給與記憶體版相同的 merge / 彙總函式處理，結果依鍵的字典序逐批產出
+#
+#   MERGE_MEMORY_MB：每一側累積多少資料就寫出一個 run (預設 512)
+#   SORT_MERGE_THRESHOLD_MB：輸入檔總大小超過此值時改走本引擎 (預設 100)
+#   SPILL_DIR：暫存 run 檔的位置 (預設為系統暫存資料夾)
+# ==========================================
+
+KEY_COL = '_sort_key'
+KEY_SEP = "\x1f"  # 比任何可見字元都小，組合鍵的字串順序與 (鍵1, 鍵2) 的字典序一致
+
+MERGE_MEMORY_BYTES = int(float(os.environ.get("MERGE_MEMORY_MB", "512")) * 1024 * 1024)
+SORT_MERGE_THRESHOLD_BYTES = int(float(os.environ.get("SORT_MERGE_THRESHOLD_MB", "100")) * 1024 * 1024)
+BLOCK_ROWS = 50000
+
+
+def use_sort_merge(files):
+    """
+    輸入檔 (上傳檔或路徑) 總大小超過 SORT_MERGE_THRESHOLD_MB 時，改走外部排序合併
+    """
+    return sum(file_size(f) for f in files if f is not None) > SORT_MERGE_THRESHOLD_BYTES
+
+
+def sort_key(*columns):
+    """
+    將一或多個已正規化的字串鍵欄位組成單一排序鍵
+    """
+    key = columns[0].astype(str)
+    for col in columns[1:]:
+        key = key + KEY_SEP + col.astype(str)
+    return key
+
+
+@contextmanager
+def spill_directory():
+    """
+    暫存 run 檔的資料夾，離開區塊時整個刪除
+    """
+    with tempfile.TemporaryDirectory(prefix="reconcile_spill_", dir=os.environ.get("SPILL_DIR") or None) as path:
+        yield path
+
+
+class RunSpiller:
+    """
+    累積一側的資料區塊 (需含 KEY_COL)；估計大小超過 budget_bytes 時依鍵穩定排序後寫出一個 run 檔
+    run 檔內為連續 pickle 的 DataFrame 區塊 (每塊 block_rows 列)，合併時逐塊讀回
+    """
+
+    def __init__(self, directory, name, budget_bytes=None, block_rows=BLOCK_ROWS):
+        self.directory = directory
+        self.name = name
+        self.budget_bytes = MERGE_MEMORY_BYTES if budget_bytes is None else budget_bytes
+        self.block_rows = block_rows
+        self.runs = []
+        self.rows = 0
+        self.columns = None
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def add(self, df):
+        if df.empty:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self._buffer.append(df)
+        self._buffer_bytes += int(df.memory_usage(index=False, deep=True).sum())
+        self.rows += len(df)
+        if self._buffer_bytes >= self.budget_bytes:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        # 穩定排序：同鍵的列維持輸入順序 (run 之間也依序編號)，去重時「保留第一筆」的語意不變
+        df = pd.concat(self._buffer, ignore_index=True).sort_values(KEY_COL, kind='stable', ignore_index=True)
+        self._buffer, self._buffer_bytes = [], 0
+        path = os.path.join(self.directory, f"{self.name}_{len(self.runs):05d}.pkl")
+        with open(path, "wb") as fh:
+            for start in range(0, len(df), self.block_rows):
+                pickle.dump(df.iloc[start:start + self.block_rows], fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+
+    def close(self):
+        """
+        寫出剩餘的資料，回傳所有 run 檔路徑 (依寫出順序)
+        """
+        self._flush()
+        return list(self.runs)
+
+
+class _RunReader:
+    # 逐塊讀回一個 run 檔；buffer 為目前在記憶體中、尚未輸出的列 (依鍵排序)
+    def __init__(self, path):
+        self._fh = open(path, "rb")
+        self.buffer = None
+        self.eof = False
+        self._load()
+
+    def _load(self):
+        try:
+            block = pickle.load(self._fh)
+        except EOFError:
+            self.eof = True
+            self._fh.close()
+            return
+        self.buffer = block if self.buffer is None or self.buffer.empty else pd.concat([self.buffer, block], ignore_index=True)
+
+    def last_key(self):
+        return self.buffer[KEY_COL].iat[-1] if self.buffer is not None and not self.buffer.empty else None
+
+    def extend_past(self, bound):
+        # 讀到緩衝區最後一個鍵大於 bound 為止，確保鍵等於 bound 的列全部在記憶體中
+        while not self.eof and (self.buffer is None or self.buffer.empty or self.buffer[KEY_COL].iat[-1] <= bound):
+            self._load()
+
+    def take_through(self, bound):
+        if self.buffer is None or self.buffer.empty:
+            return None
+        if bound is None:
+            taken, self.buffer = self.buffer, None
+            return taken
+        cut = int(np.searchsorted(self.buffer[KEY_COL].to_numpy(dtype=object), bound, side='right'))
+        taken, self.buffer = self.buffer.iloc[:cut], self.buffer.iloc[cut:]
+        if self.buffer.empty and not self.eof:
+            self.buffer = None
+            self._load()
+        return taken
+
+    def close(self):
+        if not self.eof:
+            self._fh.close()
+            self.eof = True
+
+
+def iter_key_batches(*sides, columns=None):
+    """
+    sides：各側的 run 檔路徑清單 (RunSpiller.close() 的回傳值)
+    依鍵由小到大逐批產出 tuple(各側 DataFrame)，同一個鍵在各側的所有列一定落在同一批
+    各批內依鍵穩定排序；columns 為各側的欄位清單，某側該批沒有資料時以空表補上
+    """
+    readers = [[_RunReader(path) for path in runs] for runs in sides]
+    columns = columns or [None] * len(sides)
+    try:
+        while True:
+            active = [r for side in readers for r in side if r.buffer is not None and not r.buffer.empty]
+            if not active:
+                return
+            # 本批上界：尚未讀完的 run 中，緩衝區最後一個鍵的最小值 (已讀完的 run 不限制上界)
+            pending = [r.last_key() for r in active if not r.eof]
+            bound = min(pending) if pending else None
+            if bound is not None:
+                for r in active:
+                    if r.last_key() == bound:
+                        r.extend_past(bound)
+
+            batch = []
+            for side, cols in zip(readers, columns):
+                parts = [p for p in (r.take_through(bound) for r in side) if p is not None and not p.empty]
+                if parts:
+                    df = pd.concat(parts, ignore_index=True).sort_values(KEY_COL, kind='stable', ignore_index=True)
+                else:
+                    df = pd.DataFrame(columns=cols if cols is not None else [KEY_COL])
+                batch.append(df)
+            yield tuple(batch)
+    finally:
+        for side in readers:
+            for r in side:
+                r.close()
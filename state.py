@@ -0,0 +1,161 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+# ==========================================
+# 跨月對帳狀態 (本機 SQLite 檔)：記錄每個比對鍵 (訂單編號 + 比對用車牌 的 64-bit 指紋，見 keycodes.key_fingerprint)
+# 最早在哪個月份出現在 A 表 / B 表，依 (對帳模式, 廠商, 明細類別) 分開保存
+# - 前期已兩邊對上的鍵：本期不再比對 (只處理新增 / 變動的列)
+# - 前期只出現在一邊、本期在另一邊出現：視為跨月對上 (例：月底訂單隔月才請款)
+# - 前期只出現在一邊、本期仍未出現：列為前期未結
+# 同一月份重跑時以最後一次執行為準；執行期間只讀取，結束時才在單一交易內寫入 (多個工作可共用同一個檔案)
+#
+#   RECONCILE_STATE_DB：狀態檔路徑 (介面啟用跨月對帳時使用；未設定時介面不顯示此選項)
+# ==========================================
+
+STATE_DB = os.environ.get("RECONCILE_STATE_DB") or None
+# 其他工作寫入中時最多等待的秒數
+STATE_TIMEOUT = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_keys (
+    mode TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    fp INTEGER NOT NULL,
+    order_id TEXT,
+    match_key TEXT,
+    a_period TEXT,
+    b_period TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (mode, vendor, stream, fp)
+) WITHOUT ROWID;
+"""
+
+
+def current_period():
+    return datetime.now().strftime("%Y/%m")
+
+
+def check_period(period):
+    """
+    對帳月份正規化為 YYYY/MM (也接受 YYYY-MM)
+    """
+    text = str(period).strip().replace("-", "/")
+    if not re.fullmatch(r"\d{4}/(0[1-9]|1[0-2])", text):
+        raise ValueError(f"對帳月份格式錯誤：{period} (應為 YYYY/MM)")
+    return text
+
+
+class StateStore:
+    """
+    一次對帳執行使用的狀態檔連線：prior() 查詢前期紀錄、record() 暫存本期出現的鍵，
+    commit() 寫回狀態檔；未 commit() 就 close() (例：流程中途出錯) 則本次執行不留下任何紀錄
+    """
+
+    def __init__(self, path, mode, vendor="", period=None):
+        self.path = path
+        self.mode = mode
+        self.vendor = vendor or ""
+        self.period = check_period(period or current_period())
+        self._streams = set()
+        self._conn = sqlite3.connect(path, timeout=STATE_TIMEOUT, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+        # 本次執行的查詢與暫存紀錄放在連線私有的 TEMP 表，不鎖住狀態檔
+        self._conn.executescript(
+            "CREATE TEMP TABLE probe (fp INTEGER PRIMARY KEY);"
+            "CREATE TEMP TABLE pending (stream TEXT, side TEXT, fp INTEGER, order_id TEXT, match_key TEXT);"
+        )
+
+    def _scope(self, stream):
+        return (self.mode, self.vendor, stream)
+
+    def prior(self, stream, fps):
+        """
+        fps (uint64 指紋陣列) 中各鍵在本期之前最早出現在 A 表 / B 表的月份，回傳兩個與 fps 對齊的陣列 (無紀錄為 None)
+        """
+        keys = np.asarray(fps, dtype=np.uint64).view(np.int64)
+        conn = self._conn
+        conn.execute("DELETE FROM probe")
+        conn.executemany("INSERT OR IGNORE INTO probe VALUES (?)", ((int(k),) for k in keys))
+        rows = conn.execute(
+            "SELECT k.fp,"
+            " CASE WHEN k.a_period < ? THEN k.a_period END,"
+            " CASE WHEN k.b_period < ? THEN k.b_period END"
+            " FROM probe p JOIN match_keys k ON k.mode = ? AND k.vendor = ? AND k.stream = ? AND k.fp = p.fp",
+            (self.period, self.period, *self._scope(stream)),
+        ).fetchall()
+        a_period = np.full(len(keys), None, dtype=object)
+        b_period = np.full(len(keys), None, dtype=object)
+        if rows:
+            found = np.array([r[0] for r in rows], dtype=np.int64)
+            order = np.argsort(found)
+            pos = np.minimum(np.searchsorted(found, keys, sorter=order), len(found) - 1)
+            hit = found[order[pos]] == keys
+            a_period[hit] = np.array([r[1] for r in rows], dtype=object)[order[pos[hit]]]
+            b_period[hit] = np.array([r[2] for r in rows], dtype=object)[order[pos[hit]]]
+        return a_period, b_period
+
+    def record(self, stream, side, fps, order_ids, match_keys):
+        """
+        暫存本期出現在 A 表 (side="a") 或 B 表 (side="b") 的鍵，commit() 時才寫入
+        """
+        self._streams.add(stream)
+        keys = np.asarray(fps, dtype=np.uint64).view(np.int64)
+        self._conn.executemany(
+            "INSERT INTO pending VALUES (?, ?, ?, ?, ?)",
+            zip([stream] * len(keys), [side] * len(keys), keys.tolist(), map(str, order_ids), map(str, match_keys)),
+        )
+
+    def open_items(self, stream):
+        """
+        前期只出現在一邊、本期兩邊都沒有再出現的鍵：回傳 [(訂單編號, 比對用車牌, A表月份, B表月份), ...]
+        """
+        return self._conn.execute(
+            "SELECT order_id, match_key, a, b FROM ("
+            " SELECT fp, order_id, match_key,"
+            "  CASE WHEN a_period < :p THEN a_period END AS a,"
+            "  CASE WHEN b_period < :p THEN b_period END AS b"
+            " FROM match_keys WHERE mode = :mode AND vendor = :vendor AND stream = :stream"
+            ") WHERE (a IS NULL) <> (b IS NULL)"
+            " AND fp NOT IN (SELECT fp FROM pending WHERE stream = :stream)"
+            " ORDER BY coalesce(a, b), order_id",
+            {"p": self.period, "mode": self.mode, "vendor": self.vendor, "stream": stream},
+        ).fetchall()
+
+    def commit(self):
+        """
+        寫回本期紀錄：先清除本期先前執行留下的月份 (重跑以本次為準)，再合併本次出現的鍵 (各邊保留最早的月份)
+        """
+        conn = self._conn
+        now = datetime.now().isoformat(timespec="seconds")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for stream in self._streams:
+                scope = self._scope(stream)
+                conn.execute("UPDATE match_keys SET a_period = NULL WHERE mode = ? AND vendor = ? AND stream = ? AND a_period = ?", (*scope, self.period))
+                conn.execute("UPDATE match_keys SET b_period = NULL WHERE mode = ? AND vendor = ? AND stream = ? AND b_period = ?", (*scope, self.period))
+            conn.execute(
+                "INSERT INTO match_keys (mode, vendor, stream, fp, order_id, match_key, a_period, b_period, updated_at)"
+                " SELECT :mode, :vendor, stream, fp, order_id, match_key,"
+                "  CASE side WHEN 'a' THEN :p END, CASE side WHEN 'b' THEN :p END, :now"
+                " FROM pending WHERE true"
+                " ON CONFLICT (mode, vendor, stream, fp) DO UPDATE SET"
+                "  a_period = CASE WHEN excluded.a_period IS NULL THEN a_period WHEN a_period IS NULL THEN excluded.a_period ELSE min(a_period, excluded.a_period) END,"
+                "  b_period = CASE WHEN excluded.b_period IS NULL THEN b_period WHEN b_period IS NULL THEN excluded.b_period ELSE min(b_period, excluded.b_period) END,"
+                "  updated_at = excluded.updated_at",
+                {"mode": self.mode, "vendor": self.vendor, "p": self.period, "now": now},
+            )
+            conn.execute("DELETE FROM match_keys WHERE a_period IS NULL AND b_period IS NULL")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DELETE FROM pending")
+        self._streams.clear()
+
+    def close(self):
+        self._conn.close()
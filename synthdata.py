@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import xlsxwriter
+
+# ==========================================
+# 合成測試資料產生器：產生與正式報表格式相同的 A / B 表，供效能量測 (bench.py) 使用
+# 同一組 (模式, 筆數, seed) 每次產生的內容完全相同，量測結果才能前後比較
+#
+#   python synthdata.py car-wash --rows 100000 -o bench_data
+#   python synthdata.py litv --rows 50000 -o bench_data
+#   python synthdata.py points --rows 1000000 -o bench_data
+# ==========================================
+
+# 單一工作表最多 1,048,576 列；洗車 A 表超過時拆成多個檔案 (介面本來就支援多檔上傳)
+EXCEL_MAX_ROWS = 1048576
+# LiTV / 點數對帳只讀取單一檔案的單一工作表，無法拆檔：筆數超過工作表上限 (扣除標題列) 時截斷，檔名與 job 記錄實際筆數
+ROW_LIMITS = {'litv': EXCEL_MAX_ROWS - 3, 'points': EXCEL_MAX_ROWS - 1}
+BASE_DATE = datetime(2026, 9, 1)
+LITV_SKUS = np.array(['LiTV_LUX_1M_OT', 'LiTV_LUX_1Y_OT', 'LiTV_OTHER_3M_OT'], dtype=object)
+LITV_PRICES = np.array([250, 2290, 699])
+
+
+def actual_rows(mode, rows):
+    """
+    實際產生的筆數 (LiTV / 點數受單一工作表上限限制)
+    """
+    return min(int(rows), ROW_LIMITS.get(mode, int(rows)))
+
+
+def _suffix(rows, seed, vendor_mode=False):
+    # 檔名一律帶筆數、seed 與廠商新制旗標：不同參數產生的檔案不會互相覆蓋
+    return f"{rows}_s{seed}{'_vendor' if vendor_mode else ''}"
+
+
+def _workbook(path):
+    # constant_memory：逐列寫出，百萬列也不會在記憶體保留整張表
+    return xlsxwriter.Workbook(path, {'constant_memory': True})
+
+
+def _order_ids(rng, n, start=202609000000):
+    ids = np.arange(start, start + n, dtype=np.int64)
+    return ids[rng.permutation(n)]
+
+
+def _phones(rng, n):
+    return 900000000 + rng.integers(0, 99999999, size=n)
+
+
+def _plates(rng, n):
+    letters = np.array(list('ABCDEFGHJKLMNPQRSTUVWXYZ'))
+    heads = [''.join(x) for x in letters[rng.integers(0, len(letters), size=(n, 3))]]
+    return np.array([f"{h}-{d:04d}" for h, d in zip(heads, rng.integers(0, 10000, size=n))], dtype=object)
+
+
+def _id_cell(order_id, style):
+    # 正式報表的訂單編號有三種寫法：數字、文字、系統匯出的 "xxx.0" 文字
+    if style == 1:
+        return str(order_id)
+    if style == 2:
+        return f"{order_id}.0"
+    return int(order_id)
+
+
+def _phone_cell(phone, style):
+    # 手機號碼常被 Excel 存成數字而失去開頭的 0
+    return int(phone) if style == 0 else f"0{phone}"
+
+
+def _plate_cell(plate, style):
+    # 車牌寫法不一：ABC-1234 / abc 1234 / ABC1234
+    if style == 1:
+        return plate.replace('-', ' ').lower()
+    if style == 2:
+        return plate.replace('-', '')
+    return plate
+
+
+def _write_title(ws, title, n):
+    ws.write_row(0, 0, [title])
+    ws.write_row(1, 0, [f"資料筆數：{n}", f"產生時間：{BASE_DATE:%Y/%m/%d}"])
+
+
+def _chunks(n, size):
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+# ==========================================
+# 🚗 洗車 / 三合一：CMX A 表 (標題列在第 3 列) + TMS 請款明細 B 表
+# ==========================================
+def car_wash_frames(rows, seed=0, match_rate=0.95, refund_rate=0.03, dup_rate=0.005):
+    """
+    產生洗車與三合一 A 表的欄位陣列 (dict of numpy arrays)，以及 B 表要收錄的列索引
+    """
+    rng = np.random.default_rng(seed)
+    n = int(rows)
+    a = {
+        'id': _order_ids(rng, n),
+        'phone': _phones(rng, n),
+        'plate': _plates(rng, n),
+        'amount': rng.choice([150, 250, 399], size=n),
+        'created': rng.integers(0, 30 * 86400, size=n),
+        'refund': rng.random(n) < refund_rate,
+        'id_style': rng.choice(3, size=n, p=[0.9, 0.09, 0.01]),
+        'phone_style': rng.choice(2, size=n, p=[0.7, 0.3]),
+        'plate_style': rng.choice(3, size=n, p=[0.8, 0.1, 0.1]),
+        'three_in_one': rng.random(n) < 0.3,
+    }
+    # 少量重複列 (同訂單重複匯出)
+    dups = np.flatnonzero(rng.random(n) < dup_rate)
+    in_b = (rng.random(n) < match_rate) & ~a['refund']
+    return a, dups, in_b, rng
+
+
+def write_car_wash(out_dir, rows, seed=0, vendor_mode=False):
+    """
+    產生 洗車 A 表 (可能多檔)、三合一 A 表、TMS 請款明細 B 表，回傳 {'wash': [...], '3in1': [...], 'billing': path}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    a, dups, in_b, rng = car_wash_frames(rows, seed)
+    header = ['訂單編號', '訂單建立時間', '車牌', '手機號碼', '金額', '退款時間']
+    per_file = EXCEL_MAX_ROWS - 3 - len(dups)
+    paths = {'wash': [], '3in1': []}
+
+    for label, key, mask in (('洗車', 'wash', ~a['three_in_one']), ('三合一', '3in1', a['three_in_one'])):
+        idx = np.concatenate([np.flatnonzero(mask), dups[mask[dups]]])
+        for part, (lo, hi) in enumerate(_chunks(len(idx), per_file)):
+            path = os.path.join(out_dir, f"{key}_A_{_suffix(rows, seed, vendor_mode)}_{part + 1}.xlsx")
+            wb = _workbook(path)
+            ws = wb.add_worksheet('訂單明細')
+            _write_title(ws, f"CMX {label}訂單報表", hi - lo)
+            ws.write_row(2, 0, header)
+            for r, i in enumerate(idx[lo:hi], start=3):
+                ws.write_row(r, 0, [
+                    _id_cell(a['id'][i], a['id_style'][i]),
+                    (BASE_DATE + timedelta(seconds=int(a['created'][i]))).strftime('%Y/%m/%d %H:%M'),
+                    _plate_cell(a['plate'][i], a['plate_style'][i]),
+                    _phone_cell(a['phone'][i], a['phone_style'][i]),
+                    int(a['amount'][i]),
+                    '2026/09/15 10:00' if a['refund'][i] else None,
+                ])
+            wb.close()
+            paths[key].append(path)
+
+    path = os.path.join(out_dir, f"TMS_billing_{_suffix(rows, seed, vendor_mode)}.xlsx")
+    wb = _workbook(path)
+    ws = wb.add_worksheet('請款')
+    _write_title(ws, "TMS 請款明細", int(in_b.sum()))
+    ws.write_row(2, 0, ['提供日期', '轉檔筆數', '轉檔請款金額', '備註', '簡訊請款金額'])
+    for d in range(30):
+        ws.write_row(3 + d, 0, [(BASE_DATE + timedelta(days=d)).strftime('%Y/%m/%d'), int(rng.integers(100, 999)), int(rng.integers(10000, 99999)), '', int(rng.integers(0, 500))])
+
+    extra = max(1, int(rows * 0.02))
+    for sheet, mask in (('洗車明細', ~a['three_in_one']), ('三合一明細', a['three_in_one'])):
+        idx = np.flatnonzero(in_b & mask)
+        ws = wb.add_worksheet(sheet)
+        ws.write_row(0, 0, ['訂單編號', '車牌', '手機號碼', '金額'])
+        r = 1
+        for i in idx:
+            plate = a['plate'][i].replace('-', '')
+            ws.write_row(r, 0, [int(a['id'][i]), f"{str(a['phone'][i])[-7:]}-{plate}" if vendor_mode else plate, _phone_cell(a['phone'][i], 0), int(a['amount'][i])])
+            r += 1
+        # B 表獨有的訂單 (A 表沒有)
+        for k in range(extra):
+            ws.write_row(r, 0, [int(302609000000 + k + (0 if sheet == '洗車明細' else extra)), f"ZZZ{k % 10000:04d}", int(900000000 + k), 150])
+            r += 1
+        ws.write_row(r, 0, ['合計', None, None, int(a['amount'][idx].sum())])
+    wb.close()
+    paths['billing'] = path
+    return paths
+
+
+# ==========================================
+# 📺 LiTV：CMX A 表 (header=2) + LiTV 請款明細 (ACG對帳明細，含「不計費」分隔列)
+# ==========================================
+def write_litv(out_dir, rows, seed=0, match_rate=0.95, refund_rate=0.03, unbilled_rows=200):
+    """
+    產生 LiTV A 表與 B 表，回傳 {'a': path, 'b': path}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n = actual_rows('litv', rows)
+    ids, phones = _order_ids(rng, n), _phones(rng, n)
+    sku_idx = rng.choice(3, size=n, p=[0.6, 0.3, 0.1])
+    amounts = np.where(rng.random(n) < 0.02, 0, LITV_PRICES[sku_idx])
+    refund = rng.random(n) < refund_rate
+    phone_style = rng.choice(2, size=n, p=[0.7, 0.3])
+
+    path_a = os.path.join(out_dir, f"litv_A_{_suffix(n, seed)}.xlsx")
+    wb = _workbook(path_a)
+    ws = wb.add_worksheet('訂單明細')
+    _write_title(ws, "CMX LiTV 訂單報表", n)
+    ws.write_row(2, 0, ['訂單編號', '金額', '退款時間', '手機號碼', '方案(SKU)'])
+    for r in range(n):
+        ws.write_row(r + 3, 0, [int(ids[r]), int(amounts[r]), '2026/09/15 10:00' if refund[r] else None, _phone_cell(phones[r], phone_style[r]), LITV_SKUS[sku_idx[r]]])
+    wb.close()
+
+    billable = np.flatnonzero((amounts > 0) & ~refund & (rng.random(n) < match_rate))
+    extra = max(1, int(n * 0.02))
+    path_b = os.path.join(out_dir, f"litv_B_{_suffix(n, seed)}.xlsx")
+    wb = _workbook(path_b)
+    ws = wb.add_worksheet('摘要')
+    ws.write_row(0, 0, ['項目', '筆數'])
+    ws.write_row(1, 0, ['ACG 計費筆數', len(billable) + extra])
+    ws = wb.add_worksheet('ACG對帳明細')
+    ws.write_row(0, 0, ['編號', '手機/虛擬帳號', '廠商對帳key1', '金額'])
+    r = 1
+    for i in billable:
+        key = LITV_SKUS[sku_idx[i]]
+        if key == 'LiTV_LUX_1Y_OT' and rng.random() < 0.5:
+            key = 'LiTV_LUX_F1MF_1Y_OT'
+        ws.write_row(r, 0, [r, f"0{str(phones[i])[:5]}****", key, int(amounts[i])])
+        r += 1
+    for k in range(extra):
+        ws.write_row(r, 0, [r, f"0{900000 + k % 99999:06d}"[:6] + "****", LITV_SKUS[k % 2], 250])
+        r += 1
+    # 「不計費」分隔列之後的資料不列入比對
+    ws.write_row(r, 0, ['以下不計費'])
+    for k in range(unbilled_rows):
+        ws.write_row(r + 1 + k, 0, [r + 1 + k, f"0{910000 + k:06d}"[:6] + "****", 'LiTV_LUX_1M_OT', 0])
+    ws = wb.add_worksheet('CMX對帳明細')
+    ws.write_row(0, 0, ['(上期資料，執行時會被取代)'])
+    wb.close()
+    return {'a': path_a, 'b': path_b}
+
+
+# ==========================================
+# 💰 和泰點數：附件一 (CMX 訂單報表，標題列在第 3 列) + 附件二 (點數歷程，含正負相抵)
+# ==========================================
+def write_points(out_dir, rows, seed=0, refund_rate=0.03, cancel_rate=0.05, missing_rate=0.01):
+    """
+    產生點數對帳的附件一與附件二，rows 為附件二 (點數歷程) 的列數；回傳 {'a': path, 'b': path}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_ledger = actual_rows('points', rows)
+    n_orders = max(1, int(n_ledger / (1 + 2 * cancel_rate)))
+    ids = _order_ids(rng, n_orders)
+    points = rng.choice([10, 20, 50, 100], size=n_orders)
+    refund = rng.random(n_orders) < refund_rate
+
+    path_a = os.path.join(out_dir, f"points_A_{_suffix(n_ledger, seed)}.xlsx")
+    wb = _workbook(path_a)
+    ws = wb.add_worksheet('附件一')
+    _write_title(ws, "CMX 訂單報表 (附件一)", n_orders)
+    ws.write_row(2, 0, ['訂單編號', '訂單建立時間', '總金額', '和泰點數', '退款時間'])
+    created = rng.integers(0, 30 * 86400, size=n_orders)
+    for r in range(n_orders):
+        ws.write_row(r + 3, 0, [str(ids[r]), (BASE_DATE + timedelta(seconds=int(created[r]))).strftime('%Y/%m/%d'), int(points[r]) * 10, int(points[r]), '2026/09/20' if refund[r] else None])
+    wb.close()
+
+    # 每筆訂單一筆兌點；部分訂單先取消 (負數) 再重新兌點，退款訂單只有兌點 + 取消
+    cancel = (rng.random(n_orders) < cancel_rate) | refund
+    present = rng.random(n_orders) >= missing_rate
+    id_style = rng.choice(2, size=n_orders, p=[0.8, 0.2])
+    path_b = os.path.join(out_dir, f"points_B_{_suffix(n_ledger, seed)}.xlsx")
+    wb = _workbook(path_b)
+    ws = wb.add_worksheet('附件二')
+    ws.write_row(0, 0, ['特約商交易序號', '兌點數', '交易類型', '交易時間'])
+    r = 1
+    for i in np.flatnonzero(present):
+        if r >= n_ledger:
+            break
+        tid = _id_cell(ids[i], id_style[i])
+        ws.write_row(r, 0, [tid, int(points[i]), '點數兌換', '2026/09/10'])
+        r += 1
+        if cancel[i] and r + 1 < n_ledger:
+            ws.write_row(r, 0, [tid, -int(points[i]), '點數交易取消', '2026/09/11'])
+            r += 1
+            if not refund[i]:
+                ws.write_row(r, 0, [tid, int(points[i]), '點數兌換', '2026/09/12'])
+                r += 1
+    wb.close()
+    return {'a': path_a, 'b': path_b}
+
+
+GENERATORS = {'car-wash': write_car_wash, 'litv': write_litv, 'points': write_points}
+
+
+def generate(mode, rows, out_dir, seed=0, **kwargs):
+    """
+    產生指定模式與筆數的測試檔；檔案已存在時直接沿用 (同一組參數內容相同)
+    回傳 batch.py manifest 格式的 job dict，另含實際筆數 "rows" (見 actual_rows)
+    """
+    rows = actual_rows(mode, rows)
+    marker = os.path.join(out_dir, f".{mode}_{_suffix(rows, seed, kwargs.get('vendor_mode'))}.json")
+    paths = None
+    if os.path.exists(marker):
+        with open(marker, encoding='utf-8') as fh:
+            paths = json.load(fh)
+    if paths is None or not all(os.path.exists(p) for v in paths.values() for p in (v if isinstance(v, list) else [v])):
+        paths = GENERATORS[mode](out_dir, rows, seed=seed, **kwargs)
+        with open(marker, 'w', encoding='utf-8') as fh:
+            json.dump(paths, fh, ensure_ascii=False)
+    job = {'mode': mode, 'rows': rows, **paths}
+    if mode == 'car-wash':
+        job['vendor_mode'] = bool(kwargs.get('vendor_mode'))
+    return job
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生對帳用的合成測試資料")
+    parser.add_argument("mode", choices=sorted(GENERATORS))
+    parser.add_argument("--rows", type=int, default=10000, help="A 表筆數 (點數模式為附件二列數)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vendor-mode", action="store_true", help="洗車 B 表車牌改為「手機後7碼-車牌」")
+    parser.add_argument("-o", "--output-dir", default="bench_data")
+    args = parser.parse_args(argv)
+    if args.vendor_mode and args.mode != 'car-wash':
+        parser.error("--vendor-mode 只適用於 car-wash")
+    kwargs = {'vendor_mode': True} if args.vendor_mode else {}
+    job = generate(args.mode, args.rows, args.output_dir, seed=args.seed, **kwargs)
+    print(job)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from openpyxl import load_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthdata  # noqa: E402
+
+# ==========================================
+# 大檔引擎 (外部排序合併 / 串流讀取 / constant_memory 寫出) 與預設引擎的輸出須一致
+# 門檻在匯入時讀取，因此每次對帳都在子行程中以環境變數指定
+# ==========================================
+
+ROWS = 300
+FORCED = {"SORT_MERGE_THRESHOLD_MB": "0", "STREAM_THRESHOLD_MB": "0", "CONSTANT_MEMORY_ROWS": "0"}
+JOBS = {
+    "car-wash": ("car-wash", {}),
+    "car-wash-vendor": ("car-wash", {"vendor_mode": True}),
+    "litv": ("litv", {}),
+    "points": ("points", {}),
+}
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("synthdata"))
+
+
+def run(job, out_dir, env):
+    # 子行程執行 batch.save_job，回傳結果活頁簿路徑 (磁碟解析快取停用，避免兩次執行共用解析結果)
+    env = {**os.environ, "PARSE_CACHE_DISK_MB": "0", **env}
+    code = "import batch, json, sys; print(json.dumps(batch.save_job(json.loads(sys.argv[1]), sys.argv[2])))"
+    proc = subprocess.run([sys.executable, "-c", code, json.dumps(job), out_dir], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert summary["ok"], open(summary["log"], encoding="utf-8").read()
+    return summary["output"]
+
+
+def cells(path):
+    # {工作表: [(儲存格, 值, 填滿樣式, 填滿顏色), ...]}
+    wb = load_workbook(path)
+    try:
+        return {
+            ws.title: [(c.coordinate, c.value, c.fill.fill_type, c.fill.fgColor.rgb) for row in ws.iter_rows() for c in row]
+            for ws in wb.worksheets
+        }
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize("name", sorted(JOBS))
+def test_large_file_engines_match_default(name, data_dir, tmp_path):
+    mode, kwargs = JOBS[name]
+    job = synthdata.generate(mode, ROWS, data_dir, **kwargs)
+    job.pop("rows")
+
+    expected = cells(run(job, str(tmp_path / "default"), {}))
+    actual = cells(run(job, str(tmp_path / "forced"), FORCED))
+
+    assert list(actual) == list(expected)
+    for sheet in expected:
+        assert actual[sheet] == expected[sheet], sheet
@@ -0,0 +1,287 @@
+import os
+import streamlit as st
+
+from exporters import DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS, mime_type
+
+# ==========================================
+# 各對帳模式的頁面 (app.py / app01.py 共用)
+# Streamlit 每次互動都會重跑整個腳本：這裡只放介面，對帳在背景佇列的子行程執行 (見 jobs.py)，
+# 本行程在第一次送出工作時才載入 jobs / batch (連同 pandas / openpyxl)，切換模式、上傳檔案等互動不需要載入
+# 模組層級只載入 streamlit 與只用標準函式庫的 exporters (輸出格式清單)；state (numpy) / archive 只在洗車頁面載入
+# ==========================================
+
+CAR_WASH = "🚗 洗車與三合一對帳 (Code A)"
+LITV = "📺 LiTV 對帳 (Code B)"
+POINTS = "💰 和泰點數對帳 (Code C)"
+
+# 執行量測 (各階段耗時 / 筆數 / 記憶體)：TRACE_MEMORY=1 時另外記錄 tracemalloc 峰值 (較慢)
+TRACE_MEMORY = os.environ.get("TRACE_MEMORY") == "1"
+
+
+def show_metrics(recorder):
+    st.markdown("**⏱️ 各階段量測**")
+    st.dataframe(recorder.table(), hide_index=True)
+
+
+def download_metrics(job):
+    st.download_button(
+        label="📊 下載執行量測 (JSON)",
+        data=job.recorder.to_json(),
+        file_name=f"{os.path.splitext(job.filename or '對帳')[0]}_metrics.json",
+        mime="application/json",
+        key=f"metrics_{job.id}"
+    )
+
+
+def car_wash_page():
+    from archive import ARCHIVE_DB
+    from state import STATE_DB, check_period, current_period
+
+    st.header("🚗 洗車與三合一 聯合對帳")
+
+    match_mode = st.radio(
+        "⚙️ 請選擇廠商車牌比對模式：",
+        ["預設模式 (純車牌比對)", "廠商新制 (手機後7碼-車牌)"],
+        horizontal=True
+    )
+
+    st.info("💡 邏輯：將【洗車】與【三合一】的 A 表分開上傳，系統會自動核對同一張 B 表裡的不同明細。")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("<h3 style='text-align: center; color: #E74C3C;'>1. CMX報表 (A表上傳區)</h3>", unsafe_allow_html=True)
+
+        # 伺服器設定 CMX_ARCHIVE_DB 時可改由歷史資料庫選取 A 表 (見 archive.py)，不需重新上傳
+        archive_options = {}
+        if ARCHIVE_DB and st.checkbox("🗄️ 由歷史資料庫選取 A 表 (依訂單日期區間)", key="car_archive"):
+            c1, c2 = st.columns(2)
+            date_from = c1.date_input("訂單日期起日", key="car_date_from")
+            date_to = c2.date_input("訂單日期迄日", key="car_date_to")
+            archive_options = {"archive_db": ARCHIVE_DB, "date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+            files_wash, files_3in1 = [], []
+        else:
+            st.markdown("**🚗 洗車 A 表 (支援多選)**")
+            files_wash = st.file_uploader(" ", type=['xlsx', 'xls'], key="wash_supplier", label_visibility="collapsed", accept_multiple_files=True)
+
+            st.markdown("**📦 三合一 A 表 (支援多選，若無則免傳)**")
+            files_3in1 = st.file_uploader(" ", type=['xlsx', 'xls'], key="3in1_supplier", label_visibility="collapsed", accept_multiple_files=True)
+
+    with col2:
+        st.markdown("<h3 style='text-align: center; color: #2E86C1;'>2. TMS請款明細 (B表)</h3>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align: center; color: transparent;'>僅限單一檔案</p>", unsafe_allow_html=True)
+        file_billing = st.file_uploader(" ", type=['xlsx', 'xls'], key="car_billing", label_visibility="collapsed")
+
+    # 伺服器設定 RECONCILE_STATE_DB 時可啟用跨月對帳 (見 state.py)
+    state_options = {}
+    if STATE_DB and st.checkbox("🗓️ 跨月對帳 (只比對新增的列，並列出前期已對帳 / 跨月對上 / 前期未結的項目)", key="car_state"):
+        c1, c2 = st.columns(2)
+        vendor = c1.text_input("廠商名稱 (各廠商的跨月紀錄分開保存)", key="car_vendor")
+        period = c2.text_input("對帳月份 (YYYY/MM)", value=current_period(), key="car_period")
+        state_options = {"state_db": STATE_DB, "vendor": vendor.strip(), "period": period.strip()}
+
+    if st.button("🚀 開始自動對帳", type="primary"):
+        # 只要有一種 A表 有上傳 (或由歷史資料庫選取)，並且 B表 有上傳，即可啟動
+        if archive_options and archive_options["date_from"] > archive_options["date_to"]:
+            st.warning("⚠️ 訂單日期起日不可晚於迄日。")
+        elif (len(files_wash) > 0 or len(files_3in1) > 0 or archive_options) and file_billing:
+            if state_options:
+                try:
+                    state_options["period"] = check_period(state_options["period"])
+                except ValueError as e:
+                    st.warning(f"⚠️ {e}")
+                    return
+            submit_job({
+                "mode": "car-wash",
+                "wash": memory_files(files_wash),
+                "3in1": memory_files(files_3in1),
+                "billing": memory_files([file_billing])[0],
+                "vendor_mode": match_mode == "廠商新制 (手機後7碼-車牌)",
+                **state_options,
+                **archive_options,
+            }, f"洗車與三合一：{file_billing.name}")
+        else:
+            st.warning("⚠️ 請確認「至少一份 A 表」與「B 表」都已完成上傳。")
+
+
+def car_wash_result(job):
+    result, logs, filename = job.output
+    with st.expander("執行紀錄 (點擊展開)", expanded=True):
+        st.write(logs)
+        show_metrics(job.recorder)
+
+    if result:
+        st.success("🎉 對帳完成！")
+        st.download_button(
+            label=f"📥 下載結果 ({filename})",
+            data=result.read,
+            file_name=filename,
+            mime=mime_type(filename),
+            key=f"result_{job.id}"
+        )
+        download_metrics(job)
+
+
+def litv_page():
+    st.header("📺 LiTV 訂單對帳")
+    st.info("💡 邏輯：A表讀 header=2，B表找 ACG對帳明細")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("<h3 style='text-align: center; color: #E74C3C;'>1. CMX報表 (A表)</h3>", unsafe_allow_html=True)
+        file_a = st.file_uploader(" ", type=['xlsx', 'xls'], key="litv_a", label_visibility="collapsed")
+    with col2:
+        st.markdown("<h3 style='text-align: center; color: #2E86C1;'>2.  LiTV請款明細  (B表)</h3>", unsafe_allow_html=True)
+        file_b = st.file_uploader(" ", type=['xlsx', 'xls'], key="litv_b", label_visibility="collapsed")
+
+    if st.button("🚀 開始 LiTV 對帳", type="primary"):
+        if file_a and file_b:
+            submit_job({"mode": "litv", "a": memory_files([file_a])[0], "b": memory_files([file_b])[0]}, f"LiTV：{file_a.name}")
+        else:
+            st.warning("⚠️ 請確認兩個檔案都已上傳。")
+
+
+def litv_result(job):
+    result, logs, diff_a, diff_b, filename = job.output
+    with st.expander("執行紀錄", expanded=True):
+        for l in logs: st.text(l)
+        show_metrics(job.recorder)
+
+    if result:
+        st.success("成功！")
+        c1, c2 = st.columns(2)
+        c1.error(f"A有B無 (共 {len(diff_a) if diff_a else 0} 筆)")
+        if diff_a: c1.dataframe(diff_a)
+        c2.warning(f"B有A無 (共 {len(diff_b) if diff_b else 0} 筆)")
+        if diff_b: c2.dataframe(diff_b)
+        st.download_button(label=f"📥 下載結果 ({filename})", data=result.read, file_name=filename, mime=mime_type(filename), key=f"result_{job.id}")
+        download_metrics(job)
+
+
+def points_page():
+    st.header("💰 和泰點數對帳")
+    st.info("💡 邏輯：附件二的正負點數自然相抵，若相加為 0，且附件一同訂單有退款時間，系統視為無差異並自動過濾。")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("<h3 style='text-align: center; color: #E74C3C;'>1. CMX 訂單報表 (附件一)</h3>", unsafe_allow_html=True)
+        file_a_pts = st.file_uploader(" ", type=['xlsx', 'xls'], key="points_a", label_visibility="collapsed")
+    with col2:
+        st.markdown("<h3 style='text-align: center; color: #2E86C1;'>2. 特約商點數歷程 (附件二)</h3>", unsafe_allow_html=True)
+        file_b_pts = st.file_uploader(" ", type=['xlsx', 'xls'], key="points_b", label_visibility="collapsed")
+
+    if st.button("🚀 開始點數對帳", type="primary"):
+        if file_a_pts and file_b_pts:
+            submit_job({"mode": "points", "a": memory_files([file_a_pts])[0], "b": memory_files([file_b_pts])[0]}, f"和泰點數：{file_a_pts.name}")
+        else:
+            st.warning("⚠️ 請確認附件一與附件二皆已完成上傳。")
+
+
+def points_result(job):
+    result, logs, diff_count, filename = job.output
+    with st.expander("執行紀錄 (點擊展開)", expanded=True):
+        for l in logs: st.text(l)
+        show_metrics(job.recorder)
+
+    if result:
+        if diff_count == 0:
+            st.success("🎉 完美吻合！未發現任何點數差異。")
+        else:
+            st.error(f"⚠️ 注意：發現 {diff_count} 筆帳務出入，請下載報表檢視。")
+
+        st.download_button(
+            label=f"📥 下載對帳結果報表 ({filename})",
+            data=result.read,
+            file_name=filename,
+            mime=mime_type(filename),
+            key=f"result_{job.id}"
+        )
+        download_metrics(job)
+
+
+# ==========================================
+# 背景對帳佇列 (見 jobs.py)：按下「開始對帳」只送出工作，結果在下方「我的對帳工作」查看與下載
+# 佇列為整個伺服器共用 (st.cache_resource)，各使用者的工作編號記在自己的 session_state
+# 執行中的工作每 2 秒更新一次進度條與即時紀錄 (事件來源見 progress.py)
+# ==========================================
+
+RESULT_VIEWS = {"car-wash": car_wash_result, "litv": litv_result, "points": points_result}
+
+# 執行中工作顯示的即時紀錄行數
+LIVE_LOG_LINES = 12
+
+
+@st.cache_resource
+def job_queue():
+    from jobs import JobQueue
+    return JobQueue(trace_memory=TRACE_MEMORY)
+
+
+def memory_files(files):
+    # 上傳檔轉為可序列化的 MemoryFile，交給背景子行程
+    from batch import MemoryFile
+    return [MemoryFile(f.name, f.getvalue()) for f in files]
+
+
+def submit_job(job, label):
+    job["export_format"] = st.session_state.get("export_format", DEFAULT_EXPORT_FORMAT)
+    job_id = job_queue().submit(job, label=label)
+    st.session_state.setdefault("job_ids", []).append(job_id)
+    st.toast(f"📨 已送出：{label}")
+
+
+def forget_job(job_id):
+    job_queue().forget(job_id)
+    st.session_state["job_ids"].remove(job_id)
+
+
+@st.fragment(run_every=2)
+def jobs_panel():
+    job_ids = st.session_state.get("job_ids", [])
+    if not job_ids:
+        return
+    queue = job_queue()
+    from jobs import QUEUED, RUNNING, DONE
+    from results import RESULT_TTL_SECONDS
+
+    st.divider()
+    stats = queue.stats()
+    st.subheader("🗂️ 我的對帳工作")
+    st.caption(f"伺服器目前 {stats['running']} / {stats['workers']} 個工作執行中，{stats['queued']} 個排隊中；結果保留 {RESULT_TTL_SECONDS / 3600:g} 小時")
+
+    for job_id in reversed(job_ids):
+        job = queue.get(job_id)
+        if job is None:
+            continue
+        if job.status == QUEUED:
+            position = queue.position(job_id)
+            st.info(f"⏳ {job.label}：排隊中 (第 {position} 順位，前面還有 {position - 1} 個工作)")
+        elif job.status == RUNNING:
+            progress = job.progress
+            st.progress(progress.fraction, text=f"⚙️ {job.label}：{progress.message} (已執行 {job.elapsed():.0f} 秒)")
+            if progress.lines:
+                st.code("\n".join(progress.lines[-LIVE_LOG_LINES:]), language=None)
+        else:
+            icon = "✅" if job.status == DONE else "❌"
+            with st.container(border=True):
+                st.markdown(f"**{icon} {job.label}** ({job.status}，耗時 {job.elapsed():.1f} 秒)")
+                if job.output:
+                    RESULT_VIEWS[job.mode](job)
+                else:
+                    for l in job.logs: st.text(l)
+                st.button("🗑️ 移除此工作", key=f"forget_{job_id}", on_click=forget_job, args=(job_id,))
+
+
+PAGES = {CAR_WASH: car_wash_page, LITV: litv_page, POINTS: points_page}
+
+
+def run_app(modes):
+    """
+    頁面基本設定 + 側邊欄選擇對帳功能，只執行選到的那一頁
+    """
+    st.set_page_config(page_title="自動對帳系統 (最終升級版)", page_icon="📊", layout="wide")
+    st.title("📊 自動對帳系統")
+
+    mode = st.sidebar.radio("請選擇對帳功能：", list(modes))
+    # 下游程式 / BI 匯入用 CSV、Parquet 可省下產生含格式 xlsx 的時間
+    st.sidebar.selectbox("📦 輸出格式：", list(EXPORT_FORMATS), format_func=EXPORT_FORMATS.get, key="export_format")
+    PAGES[mode]()
+    jobs_panel()
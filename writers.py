@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from progress import emit
+
+# ==========================================
+# 共用 Excel 輸出：整列寫入 (row-major)，可搭配 xlsxwriter constant_memory 模式
+# ==========================================
+
+# 輸出總列數超過此值時啟用 constant_memory：逐列寫出暫存檔，不在記憶體保留整張表
+CONSTANT_MEMORY_ROWS = int(os.environ.get("CONSTANT_MEMORY_ROWS", "200000"))
+
+
+def excel_writer(output, total_rows=0, constant_memory=None):
+    """
+    建立 xlsxwriter 的 ExcelWriter；大量輸出時自動啟用 constant_memory
+    總列數事先未知 (例：分批寫出的外部排序合併結果) 時以 constant_memory=True 直接指定
+    注意：constant_memory 模式下每張表都必須由上而下逐列寫入 (不可使用 df.to_excel)
+    """
+    if constant_memory is None:
+        constant_memory = total_rows > CONSTANT_MEMORY_ROWS
+    options = {'constant_memory': True} if constant_memory else {}
+    return pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': options})
+
+
+def frame_rows(df):
+    """
+    將 DataFrame 轉為逐列的 Python 清單，空值轉為 "" (xlsxwriter 不接受 NaN)
+    """
+    return df.astype(object).where(df.notna(), "").values.tolist()
+
+
+def row_formats(status, fmt_map, default=None):
+    """
+    依狀態欄 (例：_merge) 一次算出每一列要套用的格式
+    """
+    status = np.asarray(status, dtype=object)
+    conditions = [status == key for key in fmt_map]
+    return np.select(conditions, list(fmt_map.values()), default=default).tolist() if conditions else [default] * len(status)
+
+
+def write_rows(ws, first_row, rows, formats, height=None):
+    """
+    逐列以 write_row 整列寫入，每列套用各自的格式
+    """
+    for r, (values, fmt) in enumerate(zip(rows, formats), start=first_row):
+        if height:
+            ws.set_row(r, height)
+        ws.write_row(r, 0, values, fmt)
+
+
+def write_frame(writer, df, sheet_name, header_fmt=None):
+    """
+    取代 df.to_excel(writer, sheet_name, index=False) 的逐列寫法，constant_memory 模式下也能使用
+    """
+    sheet = FrameSheet(writer, sheet_name, df.columns, header_fmt)
+    sheet.append(df)
+    return sheet.ws
+
+
+class FrameSheet:
+    """
+    可分批附加資料的工作表：先寫標題列，之後每次 append 一個 DataFrame 區塊接續往下寫
+    (各區塊欄位需相同；日期欄位在第一次出現時套用日期格式)
+    """
+
+    def __init__(self, writer, sheet_name, columns, header_fmt=None, width=None, header_height=None):
+        self.writer = writer
+        self.width = width
+        self.ws = writer.book.add_worksheet(sheet_name)
+        writer.sheets[sheet_name] = self.ws
+        if width:
+            self.ws.set_column(0, len(columns) - 1, width)
+        if header_height:
+            self.ws.set_row(0, header_height)
+        self.ws.write_row(0, 0, [str(c) for c in columns], header_fmt)
+        self.rows = 0
+        self._fmt_datetime = None
+        self._datetime_cols = set()
+
+    def append(self, df, formats=None, height=None):
+        for c_idx, dtype in enumerate(df.dtypes):
+            if pd.api.types.is_datetime64_any_dtype(dtype) and c_idx not in self._datetime_cols:
+                self._fmt_datetime = self._fmt_datetime or self.writer.book.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+                self.ws.set_column(c_idx, c_idx, self.width, self._fmt_datetime)
+                self._datetime_cols.add(c_idx)
+        write_rows(self.ws, self.rows + 1, frame_rows(df), formats or [None] * len(df), height=height)
+        self.rows += len(df)
+        emit("write", self.ws.name, rows=self.rows)
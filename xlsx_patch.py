@@ -0,0 +1,351 @@
+import io
+import re
+import numbers
+import zipfile
+import posixpath
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.utils import get_column_letter, column_index_from_string
+
+# ==========================================
+# xlsx 局部修補：不經 openpyxl 全檔重寫，未變動的 part 內容原封不動
+# 只改寫 workbook / rels / content types / styles 與需要重新套格式的工作表
+# ==========================================
+
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+TYPE_WORKSHEET = NS_REL + "/worksheet"
+TYPE_STYLES = NS_REL + "/styles"
+TYPE_CALC_CHAIN = NS_REL + "/calcChain"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+
+def font_xml(size):
+    return f'<font><sz val="{size}"/></font>'
+
+
+def solid_fill_xml(rgb):
+    return f'<fill><patternFill patternType="solid"><fgColor rgb="00{rgb}"/><bgColor rgb="00{rgb}"/></patternFill></fill>'
+
+
+def _attr(tag, name):
+    m = re.search(r'\s%s="([^"]*)"' % re.escape(name), tag)
+    return m.group(1) if m else None
+
+
+def _set_attr(tag, name, value):
+    if _attr(tag, name) is not None:
+        return re.sub(r'(\s%s=")[^"]*(")' % re.escape(name), lambda m: f'{m.group(1)}{value}{m.group(2)}', tag, count=1)
+    head = re.match(r'<[\w:]+', tag).group(0)
+    return f'{head} {name}="{value}"' + tag[len(head):]
+
+
+def _prefix(xml, local_name):
+    # 取得根元素的命名空間前綴 (例：<x:worksheet> -> "x:")，大多數檔案沒有前綴
+    m = re.search(r'<(\w+:)?%s\b' % local_name, xml)
+    return (m.group(1) or "") if m else ""
+
+
+def _elements(xml, name):
+    # 不含巢狀同名元素的 <name .../> 或 <name ...>...</name>
+    return re.compile(r'<%s\b[^>]*?/>|<%s\b[^>]*>.*?</%s>' % (name, name, name), re.DOTALL)
+
+
+def _cell_xml(ref, value, style):
+    s = f' s="{style}"' if style else ""
+    if value is None or (isinstance(value, float) and value != value):
+        return f'<c r="{ref}"{s}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        text = str(int(value)) if value.is_integer() else repr(value)
+        return f'<c r="{ref}"{s}><v>{text}</v></c>'
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+class XlsxPatcher:
+    """
+    以 zip 為單位修補 xlsx：新增工作表、刪除工作表、對既有工作表的指定列重新套格式
+    """
+
+    def __init__(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.parts = {info.filename: zf.read(info) for info in zf.infolist()}
+            self.order = [info.filename for info in zf.infolist()]
+        self.changed = {}
+
+        root_rels = self._text("_rels/.rels")
+        wb_target = next(_attr(tag, "Target") for tag in re.findall(r'<\w*:?Relationship\b[^>]*>', root_rels)
+                         if _attr(tag, "Type").endswith("/officeDocument"))
+        self.wb_path = wb_target.lstrip("/")
+        self.wb_rels_path = posixpath.join(posixpath.dirname(self.wb_path), "_rels", posixpath.basename(self.wb_path) + ".rels")
+        self._xf_cache = {}
+
+    # ---------- 基本存取 ----------
+    def _text(self, path):
+        if path in self.changed:
+            return self.changed[path]
+        return self.parts[path].decode("utf-8")
+
+    def _put(self, path, text):
+        self.changed[path] = text
+        if path not in self.order:
+            self.order.append(path)
+
+    def _remove(self, path):
+        self.parts.pop(path, None)
+        self.changed.pop(path, None)
+        if path in self.order:
+            self.order.remove(path)
+
+    def _resolve(self, target):
+        if target.startswith("/"):
+            return target.lstrip("/")
+        return posixpath.normpath(posixpath.join(posixpath.dirname(self.wb_path), target))
+
+    def _relationships(self):
+        rels = self._text(self.wb_rels_path)
+        return [(tag, _attr(tag, "Id"), _attr(tag, "Type"), _attr(tag, "Target"))
+                for tag in re.findall(r'<\w*:?Relationship\b[^>]*>', rels)]
+
+    def _sheets(self):
+        """
+        回傳 [(sheet 標籤, 名稱, rId)]，依活頁簿分頁順序
+        """
+        wb = self._text(self.wb_path)
+        p = _prefix(wb, "workbook")
+        out = []
+        for tag in re.findall(r'<%ssheet\b[^>]*>' % re.escape(p), wb):
+            rid = next(v for k, v in re.findall(r'\s([\w:]+)="([^"]*)"', tag) if k.endswith(":id"))
+            out.append((tag, _attr(tag, "name"), rid))
+        return out
+
+    def sheet_names(self):
+        return [name for _, name, _ in self._sheets()]
+
+    def sheet_path(self, name):
+        rid = next(rid for _, n, rid in self._sheets() if n == name)
+        target = next(t for _, i, _, t in self._relationships() if i == rid)
+        return self._resolve(target)
+
+    # ---------- 樣式 ----------
+    def _styles_path(self):
+        target = next(t for _, _, typ, t in self._relationships() if typ == TYPE_STYLES)
+        return self._resolve(target)
+
+    def _append_to(self, xml, block, child, new_xml):
+        """
+        在 <block> 內最後加入 new_xml 並更新 count，回傳 (新 xml, 新元素索引)
+        """
+        p = _prefix(xml, block)
+        m = re.search(r'<%s%s\b[^>]*>(.*?)</%s%s>' % (re.escape(p), block, re.escape(p), block), xml, re.DOTALL)
+        start_tag = re.match(r'<[^>]*>', m.group(0)).group(0)
+        index = len(_elements(xml, re.escape(p) + child).findall(m.group(1)))
+        new_xml = re.sub(r'<(/?)(?![\w.-]+:)(?=[a-zA-Z])', lambda t: f'<{t.group(1)}{p}', new_xml)
+        block_xml = _set_attr(start_tag, "count", index + 1) + m.group(1) + new_xml + f'</{p}{block}>'
+        return xml[:m.start()] + block_xml + xml[m.end():], index
+
+    def derived_xf(self, base_xf, font_xml=None, fill_xml=None):
+        """
+        以既有的 cellXfs[base_xf] 為底，換上新的字型 / 填滿，回傳新的樣式索引 (相同組合只新增一次)
+        """
+        key = (base_xf, font_xml, fill_xml)
+        if key in self._xf_cache:
+            return self._xf_cache[key]
+
+        path = self._styles_path()
+        xml = self._text(path)
+        p = _prefix(xml, "styleSheet")
+        if font_xml is not None and ("font", font_xml) not in self._xf_cache:
+            xml, self._xf_cache[("font", font_xml)] = self._append_to(xml, "fonts", "font", font_xml)
+        if fill_xml is not None and ("fill", fill_xml) not in self._xf_cache:
+            xml, self._xf_cache[("fill", fill_xml)] = self._append_to(xml, "fills", "fill", fill_xml)
+
+        m = re.search(r'<%scellXfs\b[^>]*>(.*?)</%scellXfs>' % (re.escape(p), re.escape(p)), xml, re.DOTALL)
+        xfs = _elements(xml, re.escape(p) + "xf").findall(m.group(1))
+        base = xfs[base_xf] if base_xf < len(xfs) else f'<{p}xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        start_tag = re.match(r'<[^>]*?(?=/?>)', base).group(0)
+        rest = base[len(start_tag):]
+        if font_xml is not None:
+            start_tag = _set_attr(_set_attr(start_tag, "fontId", self._xf_cache[("font", font_xml)]), "applyFont", 1)
+        if fill_xml is not None:
+            start_tag = _set_attr(_set_attr(start_tag, "fillId", self._xf_cache[("fill", fill_xml)]), "applyFill", 1)
+        xml, index = self._append_to(xml, "cellXfs", "xf", start_tag + rest)
+        self._put(path, xml)
+        self._xf_cache[key] = index
+        return index
+
+    # ---------- 工作表增刪 ----------
+    def remove_sheet(self, name):
+        sheets = self._sheets()
+        pos = next((i for i, (_, n, _) in enumerate(sheets) if n == name), None)
+        if pos is None:
+            return
+        tag, _, rid = sheets[pos]
+        path = self.sheet_path(name)
+
+        wb = self._text(self.wb_path).replace(tag, "", 1)
+        wb = self._shift_local_sheet_ids(wb, removed=pos)
+        self._put(self.wb_path, wb)
+
+        rels = self._text(self.wb_rels_path)
+        for rel_tag, rel_id, rel_type, _ in self._relationships():
+            # 刪除工作表後 calcChain 可能指向不存在的儲存格，交由 Excel 重建
+            if rel_id == rid or rel_type == TYPE_CALC_CHAIN:
+                rels = rels.replace(rel_tag, "", 1)
+                if rel_type == TYPE_CALC_CHAIN:
+                    self._remove_part(self._resolve(_attr(rel_tag, "Target")))
+        self._put(self.wb_rels_path, rels)
+
+        self._remove_part(path)
+        self._remove(posixpath.join(posixpath.dirname(path), "_rels", posixpath.basename(path) + ".rels"))
+
+    def _remove_part(self, path):
+        self._remove(path)
+        ct = self._text("[Content_Types].xml")
+        ct = re.sub(r'<\w*:?Override\b[^>]*PartName="/%s"[^>]*/>' % re.escape(path), "", ct)
+        self._put("[Content_Types].xml", ct)
+
+    def _shift_local_sheet_ids(self, wb, removed=None, inserted=None):
+        def fix(m):
+            tag = m.group(0)
+            sid = int(_attr(tag, "localSheetId"))
+            if removed is not None and sid > removed:
+                sid -= 1
+            if inserted is not None and sid >= inserted:
+                sid += 1
+            return _set_attr(tag, "localSheetId", sid)
+
+        def drop(m):
+            if removed is not None and _attr(m.group(0), "localSheetId") == str(removed):
+                return ""
+            return m.group(0)
+
+        p = re.escape(_prefix(wb, "workbook"))
+        wb = re.sub(r'<%sdefinedName\b[^>]*>.*?</%sdefinedName>' % (p, p), drop, wb, flags=re.DOTALL)
+        return re.sub(r'<%sdefinedName\b[^>]*localSheetId="\d+"[^>]*>' % p, fix, wb)
+
+    def insert_sheet_first(self, name, rows):
+        """
+        新增工作表並放在第一個分頁；原本開啟時顯示的分頁維持不變 (避免多個分頁同時被選取成群組)
+        rows 為 [(值清單, 樣式索引或 None)]，字串以 inline string 寫入，不動 sharedStrings
+        """
+        existing = set(self.parts) | set(self.changed)
+        n = 1
+        while posixpath.join(posixpath.dirname(self.wb_path), "worksheets", f"sheet{n}.xml") in existing:
+            n += 1
+        path = posixpath.join(posixpath.dirname(self.wb_path), "worksheets", f"sheet{n}.xml")
+
+        body = []
+        for r, (values, style) in enumerate(rows, start=1):
+            cells = "".join(_cell_xml(f"{get_column_letter(c)}{r}", v, style) for c, v in enumerate(values, start=1))
+            body.append(f'<row r="{r}">{cells}</row>')
+        self._put(path, (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<sheetData>{"".join(body)}</sheetData></worksheet>'
+        ))
+
+        ct = self._text("[Content_Types].xml")
+        ct = ct.replace("</Types>", f'<Override PartName="/{path}" ContentType="{CT_WORKSHEET}"/></Types>')
+        self._put("[Content_Types].xml", ct)
+
+        rels = self._text(self.wb_rels_path)
+        used = {i for _, i, _, _ in self._relationships()}
+        k = 1
+        while f"rId{k}" in used:
+            k += 1
+        rid = f"rId{k}"
+        target = posixpath.relpath(path, posixpath.dirname(self.wb_path))
+        rp = _prefix(rels, "Relationships")
+        rels = rels.replace(f"</{rp}Relationships>",
+                            f'<{rp}Relationship Id="{rid}" Type="{TYPE_WORKSHEET}" Target="{target}"/></{rp}Relationships>')
+        self._put(self.wb_rels_path, rels)
+
+        wb = self._text(self.wb_path)
+        p = _prefix(wb, "workbook")
+        rel_prefix = re.search(r'xmlns:(\w+)="%s"' % re.escape(NS_REL), wb)
+        if rel_prefix is None:
+            wb = re.sub(r'(<%sworkbook\b)' % re.escape(p), r'\1 xmlns:r="%s"' % NS_REL, wb, count=1)
+            rel_ns = "r"
+        else:
+            rel_ns = rel_prefix.group(1)
+        sheet_ids = [int(_attr(tag, "sheetId")) for tag, _, _ in self._sheets()]
+        new_tag = f'<{p}sheet name={quoteattr(name)} sheetId="{max(sheet_ids, default=0) + 1}" {rel_ns}:id="{rid}"/>'
+        wb = re.sub(r'(<%ssheets\b[^>]*>)' % re.escape(p), lambda m: m.group(1) + new_tag, wb, count=1)
+        wb = re.sub(r'<%sworkbookView\b[^>]*>' % re.escape(p),
+                    lambda m: _set_attr(m.group(0), "activeTab", int(_attr(m.group(0), "activeTab") or 0) + 1), wb, count=1)
+        wb = self._shift_local_sheet_ids(wb, inserted=0)
+        self._put(self.wb_path, wb)
+
+    # ---------- 既有工作表重新套格式 ----------
+    def restyle_rows(self, sheet_name, first_row, last_row, style_for):
+        """
+        對 first_row..last_row (含) 每一列、第 1 欄到工作表最大欄的所有儲存格重新指定樣式
+        style_for(列號, 原樣式索引) 回傳新的樣式索引；不存在的儲存格會補上空白格 (同 openpyxl ws[row])
+        last_row 為 None 時取工作表最後一個有儲存格的列
+        """
+        path = self.sheet_path(sheet_name)
+        xml = self._text(path)
+        p = re.escape(_prefix(xml, "worksheet"))
+        m = re.search(r'(<%ssheetData\b[^>]*>)(.*?)</%ssheetData>' % (p, p), xml, re.DOTALL)
+        if m is None:
+            return
+        row_re, cell_re = _elements(xml, p + "row"), _elements(xml, p + "c")
+        cp = _prefix(xml, "worksheet")
+
+        # 先掃出每列的列號與儲存格欄位，計算最大列 / 最大欄
+        rows, max_row, max_col = [], 0, 0
+        row_number = 0
+        for row_m in row_re.finditer(m.group(2)):
+            row_xml = row_m.group(0)
+            row_tag = re.match(r'<[^>]*>', row_xml).group(0)
+            row_number = int(_attr(row_tag, "r") or row_number + 1)
+            cells, col = [], 0
+            for cell_m in cell_re.finditer(row_xml):
+                cell_tag = re.match(r'<[^>]*?(?=/?>)', cell_m.group(0)).group(0)
+                ref = _attr(cell_tag, "r")
+                col = column_index_from_string(re.match(r'[A-Z]+', ref).group(0)) if ref else col + 1
+                cells.append((col, cell_m.group(0), cell_tag))
+            if cells:
+                max_row, max_col = max(max_row, row_number), max(max_col, cells[-1][0])
+            rows.append((row_number, row_xml, row_tag, cells))
+
+        last_row = max_row if last_row is None else last_row
+        by_number = {number: (row_xml, row_tag, cells) for number, row_xml, row_tag, cells in rows}
+
+        def styled_row(number, row_tag, cells):
+            by_col = {col: (cell_xml, cell_tag) for col, cell_xml, cell_tag in cells}
+            parts = []
+            for col in sorted(set(range(1, max_col + 1)) | set(by_col)):
+                if col in by_col:
+                    cell_xml, cell_tag = by_col[col]
+                    new_s = style_for(number, int(_attr(cell_tag, "s") or 0))
+                    parts.append(_set_attr(cell_tag, "s", new_s) + cell_xml[len(cell_tag):])
+                else:
+                    parts.append(f'<{cp}c r="{get_column_letter(col)}{number}" s="{style_for(number, 0)}"/>')
+            row_tag = re.sub(r'\sspans="[^"]*"', "", row_tag)
+            if row_tag.endswith("/>"):
+                row_tag = row_tag[:-2] + ">"
+            return row_tag + "".join(parts) + f"</{cp}row>"
+
+        out = []
+        for number in sorted(set(by_number) | set(range(first_row, last_row + 1))):
+            row_xml, row_tag, cells = by_number.get(number, (None, f'<{cp}row r="{number}">', []))
+            out.append(styled_row(number, row_tag, cells) if first_row <= number <= last_row else row_xml)
+
+        sheet_data = m.group(1) + "".join(out) + xml[m.end(2):m.end()]
+        self._put(path, xml[:m.start()] + sheet_data + xml[m.end():])
+
+    # ---------- 輸出 ----------
+    def save(self, output):
+        """
+        寫出新的 xlsx：只有變動過的 part 重新產生，其餘 part 內容原封不動
+        """
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path in self.order:
+                if path in self.changed:
+                    zf.writestr(path, self.changed[path].encode("utf-8"))
+                elif path in self.parts:
+                    zf.writestr(path, self.parts[path])